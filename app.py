@@ -1,3 +1,7 @@
+import atexit
+import logging
+import logging.handlers
+import queue
 import gradio as gr
 from config.settings import Config
 from core.violation_detector import ViolationDetector
@@ -6,8 +10,17 @@ from core.video_processor import VideoProcessor
 from ui.interface import create_interface
 from models.detection_models import ModelManager
 
+def configure_logging():
+    """Send warnings and errors through a queue so a listener thread formats and writes them"""
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler())
+    logging.basicConfig(level=logging.WARNING, handlers=[logging.handlers.QueueHandler(log_queue)])
+    listener.start()
+    atexit.register(listener.stop)
+
 def main():
     """Main application entry point with enhanced features"""
+    configure_logging()
     print("🚦 Starting Enhanced Traffic Violation Detection System...")
     
     # Ensure all directories exist
@@ -22,9 +35,12 @@ def main():
     
     # Initialize core components
     print("🔧 Initializing enhanced components...")
-    detector = ViolationDetector()
-    image_processor = ImageProcessor(detector)
-    video_processor = VideoProcessor(detector)
+    # Image and video requests run concurrently, so each pipeline has its own line, tracks and
+    # caches; they share one logger so violations land in a single log and CSV
+    image_detector = ViolationDetector()
+    video_detector = ViolationDetector(logger=image_detector.logger)
+    image_processor = ImageProcessor(image_detector, model_manager)
+    video_processor = VideoProcessor(video_detector, model_manager)
     
     print("🌐 Creating enhanced web interface...")
     # Create and launch interface
@@ -4,6 +4,28 @@ class Config:
     # Model paths
     YOLO_MODEL_PATH = "yolov8s.pt"
     OCR_LANGUAGES = ['en']
+    PLATE_OCR_BACKEND = "fast_plate_ocr"  # Plate-specialised ONNX recognizer when installed; "easyocr" forces EasyOCR
+    PLATE_OCR_MODEL = "global-plates-mobile-vit-v2-model"
+    YOLO_INPUT_SIZE = 640  # Frames are letterboxed to this square size before inference
+    
+    # TensorRT export (used only when a CUDA device is available)
+    USE_TENSORRT = True
+    TENSORRT_HALF = True
+    TENSORRT_INT8 = False  # INT8 needs a calibration dataset (~500 representative frames)
+    TENSORRT_INT8_DATA = "calib.yaml"
+    TENSORRT_IMGSZ = YOLO_INPUT_SIZE
+    TENSORRT_WORKSPACE_GB = 4
+    
+    # OpenVINO export (used on CPU-only hosts); INT8 reuses the TensorRT calibration dataset
+    USE_OPENVINO = True
+    OPENVINO_INT8 = False  # Like TENSORRT_INT8, needs TENSORRT_INT8_DATA to exist
+    
+    # Inference batching
+    YOLO_BATCH_SIZE = 16
+    
+    # Detection classes
+    VEHICLE_CLASSES = frozenset({"car", "truck", "bus", "motorbike", "bicycle"})
+    TWO_WHEELER_CLASSES = frozenset({"motorbike", "bicycle"})
     
     # Detection thresholds
     VEHICLE_CONFIDENCE_THRESHOLD = 0.5
@@ -11,17 +33,62 @@ class Config:
     TRAFFIC_LIGHT_CONFIDENCE_THRESHOLD = 0.3
     LICENSE_PLATE_CONFIDENCE_THRESHOLD = 0.3  # Lowered for better detection
     
+    # License plate OCR cache
+    PLATE_CACHE_SIZE = 2048  # Tracks (or untracked crops) with remembered plates
+    PLATE_HASHES_PER_TRACK = 8  # Recent crop hashes kept per track
+    PLATE_HASH_MAX_DISTANCE = 4  # Crops whose 64-bit dHashes differ in at most this many bits share a read
+    
+    # Vehicles smaller than this are too distant for a legible plate; OCR is skipped
+    MIN_PLATE_CANDIDATE_WIDTH = 80
+    MIN_PLATE_CANDIDATE_AREA = 5000
+    
+    # Plate search rows are shrunk to this width, and EasyOCR's detector canvas capped to it
+    OCR_INPUT_WIDTH = 640
+    OCR_GUIDED_FILTER_EPS = 650.0  # Guided filter regularisation in 8-bit intensity units (~(0.1 * 255)^2)
+    OCR_BATCH_HEIGHT = 320  # Height cap for inputs resized to a common size for batched OCR
+    OCR_EARLY_EXIT_CONFIDENCE = 0.9  # A plate read this confidently from the plain crop skips the other methods
+    OCR_SKIP_REGIONS_CONFIDENCE = 0.8  # After enhanced preprocessing, this confidence skips contour regions
+    OCR_PIPELINE_CACHE_SIZE = 512  # Crop shapes with a specialised preprocessing pipeline kept
+    
     # Violation parameters
     SPEED_LIMIT_KMH = 40  # More realistic speed limit
     LINE_CROSSING_TOLERANCE = 15
     HELMET_DETECTION_RATIO = 0.15
+    HELMET_DOWNSAMPLE_SIZE = 4096  # Head crops above this many values are halved before color analysis
+    HELMET_OPENCL_MIN_PIXELS = 4096  # Smaller head crops stay on the CPU; the OpenCL transfer costs more
     NEARBY_VEHICLE_DISTANCE = 100
     
+    # JPEG output
+    JPEG_QUALITY = 85
+    
+    # Web interface
+    UI_CONCURRENCY_LIMIT = 4  # Image requests in flight at once, so the batcher has several to coalesce
+    LINE_PARSE_CACHE_SIZE = 32  # Parsed line textbox values kept; cleared when full
+    DASHBOARD_CACHE_SIZE = 16  # Rendered dashboard charts kept, keyed by their violation counts
+    UI_TABLE_ROWS = 50  # Newest violations sent to the browser table; the CSV download has them all
+    UI_QUEUE_MAX_SIZE = 16  # Requests waiting beyond this are rejected with a "queue full" error instead of waiting
+    IMAGE_BATCH_SIZE = UI_CONCURRENCY_LIMIT  # Image requests processed together; no more are ever in flight
+    IMAGE_BATCH_TIMEOUT = 0.02  # Seconds to wait for more image requests before flushing a batch
+    IMAGE_OUTPUT_SLOTS = 16  # Processed images rotate through this many files so concurrent results never collide
+    
     # File paths
     CSV_LOG_FILE = "violation_log.csv"  # Keep original filename
+    CSV_WRITE_BUFFER = 1 << 20  # Bytes buffered per CSV append before hitting the disk
     TEMP_DIR = os.path.join(os.getcwd(), "temp")
+    CSV_EXPORT_FILE = os.path.join(TEMP_DIR, "violation_log_export.csv")  # Newest-first copy offered for download
     
     # Video processing
+    VIDEO_PREFETCH = 8  # Max frames buffered between decode/compute/encode threads
+    TRACK_PRUNE_INTERVAL = 100  # Frames between sweeps of stale vehicle tracks
+    TRACK_MAX_AGE = 30  # Tracks unseen for this many frames are dropped
+    DETECTOR_RECHECK_FRAMES = 15  # Reuse a track's plate/helmet result for this many frames
+    HELMET_CACHE_CELL = 32  # Pixel grid used to key helmet results by person position
+    DETECTION_STRIDE = 1  # Run detection every Nth frame (2-3 trades accuracy for throughput)
+    USE_NVDEC = False  # Opt-in GPU decode via torchcodec; frames still round-trip through the host, so not yet faster
+    VIDEO_CODEC = "avc1"  # H.264; falls back to VIDEO_FALLBACK_CODEC if the build lacks an encoder
+    VIDEO_FALLBACK_CODEC = "mp4v"
+    VIDEO_CODEC_THREADS = os.cpu_count() or 1
+    VIDEO_STREAM_SEGMENT_FRAMES = 150  # Frames per preview segment streamed to the client; 0 disables previews
     PIXEL_TO_METER_RATIO = 0.05
     MAX_SPEED_KMH = 200
     MIN_SPEED_THRESHOLD = 5  # Minimum speed to consider for violations
@@ -32,6 +99,9 @@ class Config:
     # Zebra crossing detection - with safer defaults
     ZEBRA_CROSSING_MIN_AREA = 1000
     ZEBRA_CROSSING_WHITE_THRESHOLD = 200
+    LINE_PROBE_REDUCTION = 2  # Uploaded images are probed at 1/N size for line auto-detection
+    LINE_CACHE_TTL = 150  # Reuse an auto-detected line for up to this many lookups on an unchanged scene
+    LINE_CACHE_DIFF_THRESHOLD = 10.0  # Mean gray-level change on a 32x18 thumbnail that counts as a new scene
     
     @classmethod
     def ensure_temp_dir(cls):
@@ -1,64 +1,159 @@
 import cv2
+import itertools
 import os
-from datetime import datetime
-from models.detection_models import ModelManager
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from models.detection_models import ModelManager, BatchedDetector
 from config.settings import Config
+from core.utils import GeometryUtils, ImageUtils
 
 class ImageProcessor:
-    def __init__(self, violation_detector):
+    def __init__(self, violation_detector, model_manager=None):
         self.detector = violation_detector
-        self.model_manager = ModelManager()
+        self.model_manager = model_manager or ModelManager()
+        self.batched = BatchedDetector(model_manager=self.model_manager)
+        
+        # Per-person helmet checks are independent and release the GIL; they overlap the batched plate OCR
+        self._roi_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+        
+        # Fixed-string labels are rendered once and blitted onto every output
+        self._title_sprite, self._title_offset = self._build_text_sprite(
+            "TRAFFIC VIOLATION DETECTION", 0.8, (255, 255, 255), 2)
+        self._line_label_sprite = self._build_line_label_sprite()
+        
+        # Font metrics for per-detection labels and the timestamp, measured once
+        self._label_advances = ImageUtils.glyph_advances(cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+        self._timestamp_advances = ImageUtils.glyph_advances(cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+        
+        # Formatted wall-clock second, reformatted only when the second changes
+        self._timestamp_cache = (0, "")
+        
+        # Violation line overlay, rebuilt only when the line changes
+        self._line_sprite_cache = (None, None)
+        
+        # Rotating suffix for processed image files
+        self._output_ids = itertools.count()
+    
+    def _current_timestamp(self):
+        """Return the current local time as 'YYYY-mm-dd HH:MM:SS', cached per second"""
+        second = int(time.time())
+        cached_second, cached_text = self._timestamp_cache
+        if second != cached_second:
+            cached_text = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second))
+            self._timestamp_cache = (second, cached_text)
+        return cached_text
+    
+    def _build_text_sprite(self, text, scale, color, thickness):
+        """Pre-render text, returning the sprite and its offset from the text origin"""
+        (text_width, text_height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+        pad = thickness
+        origin = (pad, text_height + pad)
+        sprite = ImageUtils.render_sprite(
+            text_width + 2 * pad, text_height + baseline + 2 * pad,
+            lambda canvas: cv2.putText(canvas, text, origin, cv2.FONT_HERSHEY_SIMPLEX, scale, color, thickness))
+        return sprite, origin
+    
+    def _build_line_label_sprite(self):
+        """Pre-render the boxed VIOLATION LINE label used by _draw_violation_line"""
+        label = "VIOLATION LINE"
+        label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2)[0]
+        
+        # Local coordinates: label origin sits at (6, 26) inside the sprite
+        def draw(canvas):
+            cv2.rectangle(canvas, (1, 1), (label_size[0] + 11, 31), (0, 0, 0), -1)
+            cv2.rectangle(canvas, (1, 1), (label_size[0] + 11, 31), (255, 255, 0), 2)
+            cv2.putText(canvas, label, (6, 21), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 0), 2)
+        
+        return ImageUtils.render_sprite(label_size[0] + 13, 33, draw)
+    
+    def warm_up(self):
+        """Run one YOLO pass on a blank frame to pay first-inference setup before any request"""
+        # Straight to the model: a full batch would auto-detect a line from the blank frame
+        size = Config.YOLO_INPUT_SIZE
+        self.batched.infer_batch([np.zeros((size, size, 3), dtype=np.uint8)])
     
-    def process_image(self, image_path, enable_plate_detection=True):
-        """Process a single image for violations with enhanced features"""
-        frame = cv2.imread(image_path)
-        if frame is None:
-            return None, [], None
-        
-        # Auto-detect violation line if none is set
-        if not self.detector.violation_line:
-            auto_line = self.detector.auto_detect_violation_line(frame)
-            if auto_line:
-                print(f"Auto-detected violation line: {auto_line}")
-        
-        yolo_model = self.model_manager.get_yolo_model()
-        output_frame = frame.copy()
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def process_image_batch(self, images, lines, plate_flags):
+        """Process several images (paths or decoded BGR frames) with one YOLO call, one result per image"""
+        # Each image comes with its own manual line, or None to auto-detect one; results carry
+        # (output path, violations table, auto-detected line or None)
+        frames = list(self._roi_pool.map(self._decoded, images))  # cv2.imread releases the GIL
+        valid = [frame for frame in frames if frame is not None]
+        if not valid:
+            return [(None, [], None) for _ in frames]
+        
+        # Letterbox into per-image buffers (the thread's shared buffer holds one frame) and infer together
+        size = Config.YOLO_INPUT_SIZE
+        inputs = [np.zeros((size, size, 3), dtype=np.uint8) for _ in valid]
+        letterboxes = [ImageUtils.letterbox_into(frame, buffer) for frame, buffer in zip(valid, inputs)]
+        results = iter(zip(self.batched.infer_batch(inputs), letterboxes))
+        
+        outputs = []
+        for frame, line, enable_plate_detection in zip(frames, lines, plate_flags):
+            if frame is None:
+                outputs.append((None, [], None))
+            else:
+                # Images in a batch may come from different users, so each is analysed with its own line
+                auto_line = self._use_line(frame, line)
+                frame_results, letterbox = next(results)
+                output_path, violations_df, _ = self._analyze_image(
+                    frame, frame_results, letterbox, enable_plate_detection)
+                outputs.append((output_path, violations_df, auto_line))
+        return outputs
+    
+    @staticmethod
+    def _decoded(image):
+        """Return a BGR frame for an image path or an already-decoded frame"""
+        return cv2.imread(image) if isinstance(image, str) else image
+    
+    def _use_line(self, frame, line):
+        """Set line as the violation line, or auto-detect one from a thumbnail of frame if it is None"""
+        if line:
+            if self.detector.violation_line != (line[0], line[1]):
+                self.detector.set_violation_line(line[0], line[1])
+            return None
+        
+        # A previous image's line must not carry over; the detector still reuses its cached detection
+        self.detector.clear_violation_line()
+        scale = Config.LINE_PROBE_REDUCTION
+        if scale > 1:
+            height, width = frame.shape[:2]
+            frame = cv2.resize(frame, (width // scale, height // scale), interpolation=cv2.INTER_AREA)
+        return self.detector.auto_detect_violation_line(frame, scale)
+    
+    def _analyze_image(self, frame, results, letterbox, enable_plate_detection):
+        """Check one decoded image's YOLO results for violations and write the annotated output"""
+        timestamp = self._current_timestamp()
         frame_no = 0
         
-        # Run YOLO detection
-        results = yolo_model(frame)[0]
-        vehicle_detections = []
-        person_detections = []
-        traffic_lights = []
-        
-        # Parse detections
-        for box in results.boxes:
-            cls_name = yolo_model.names[int(box.cls[0])]
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            conf = float(box.conf[0])
-            
-            if cls_name in ["car", "truck", "bus", "motorbike", "bicycle"] and conf > Config.VEHICLE_CONFIDENCE_THRESHOLD:
-                vehicle_detections.append((cls_name, (x1, y1, x2, y2), conf))
-            elif cls_name == "person" and conf > Config.PERSON_CONFIDENCE_THRESHOLD:
-                person_detections.append((x1, y1, x2, y2))
-            elif cls_name == "traffic light" and conf > Config.TRAFFIC_LIGHT_CONFIDENCE_THRESHOLD:
-                traffic_lights.append((x1, y1, x2, y2))
+        # Parse all detections at once from the box tensor, in original frame coordinates
+        vehicle_detections, person_detections, traffic_lights = self.model_manager.parse_detections(
+            results, letterbox)
         
         # Detect traffic light state
         traffic_light_state = self._detect_traffic_light_state(frame, traffic_lights)
         
+        # Detectors and screenshots read the clean frame; their drawing is queued
+        overlays = []
+        
+        # Queue helmet checks first so they run on the pool alongside the plate reads
+        riders, helmet_futures = self._submit_helmet_checks(frame, person_detections, vehicle_detections)
+        
         # Process vehicle violations
-        output_frame = self._process_vehicle_violations(
-            frame, output_frame, vehicle_detections, traffic_light_state, 
+        self._process_vehicle_violations(
+            frame, overlays, vehicle_detections, traffic_light_state, 
             timestamp, frame_no, enable_plate_detection
         )
         
         # Process helmet violations
-        output_frame = self._process_helmet_violations(
-            frame, output_frame, person_detections, vehicle_detections, timestamp, frame_no
+        self._process_helmet_violations(
+            frame, overlays, riders, helmet_futures, timestamp, frame_no
         )
         
+        # All reads are done; the image was freshly decoded, so annotate it in place
+        output_frame = frame
+        ImageUtils.apply_overlays(output_frame, overlays)
+        
         # Draw violation line with enhanced visibility
         self._draw_violation_line(output_frame)
         
@@ -66,38 +161,52 @@ class ImageProcessor:
         self._add_info_panel(output_frame, traffic_light_state, len(vehicle_detections), 
                            len(person_detections), len(self.detector.logger.violations_log))
         
-        # Save processed image
-        output_path = os.path.join(Config.TEMP_DIR, "processed_image.jpg")
-        cv2.imwrite(output_path, output_frame)
+        # Save processed image; concurrent or batched images each get their own output slot
+        output_path = os.path.join(
+            Config.TEMP_DIR, f"processed_image_{next(self._output_ids) % Config.IMAGE_OUTPUT_SLOTS}.jpg")
+        ImageUtils.write_jpeg(output_path, output_frame, Config.JPEG_QUALITY)
+        
+        # Screenshots are written in the background; make sure the gallery can read them
+        self.detector.logger.wait_for_screenshots()
         
         return output_path, self.detector.logger.get_violations_dataframe(), None
     
     def _detect_traffic_light_state(self, frame, traffic_lights):
         """Detect traffic light state"""
-        for light_bbox in traffic_lights:
-            state = self.detector.traffic_light_detector.detect_color(frame, light_bbox)
-            if state != "unknown":
-                return state
-        return "unknown"
+        # Classify every light in one pass, then take the first with a known color
+        states = self.detector.traffic_light_detector.detect_colors(frame, traffic_lights)
+        return next((state for state in states if state != "unknown"), "unknown")
     
-    def _process_vehicle_violations(self, frame, output_frame, vehicle_detections, 
+    def _process_vehicle_violations(self, frame, overlays, vehicle_detections, 
                                   traffic_light_state, timestamp, frame_no, enable_plate_detection):
         """Process vehicle-related violations with enhanced detection"""
-        for vehicle_type, bbox, conf in vehicle_detections:
+        # Enhanced license plate detection, one batched OCR call for every vehicle large enough to read
+        if enable_plate_detection:
+            license_plates = self.detector.license_plate_detector.detect_license_plates(
+                frame, [bbox for _, bbox, _ in vehicle_detections])
+        else:
+            license_plates = [""] * len(vehicle_detections)
+        
+        # Red-light state and the line are fixed for this image, so test them once
+        check_red_light = self.detector.violation_line and traffic_light_state == "red"
+        if check_red_light:
+            # Test every vehicle center against the line in one vectorized pass
+            boxes = np.array([bbox for _, bbox, _ in vehicle_detections], dtype=np.int32).reshape(-1, 4)
+            crossing = self.detector.crossing_mask((boxes[:, :2] + boxes[:, 2:]) // 2)
+        is_repeat_offender = self.detector.logger.is_repeat_offender
+        
+        # Logging stays sequential on the calling thread; drawing is queued
+        has_violations = False
+        for index, ((vehicle_type, bbox, conf), license_plate) in enumerate(zip(vehicle_detections, license_plates)):
             x1, y1, x2, y2 = bbox
             center = ((x1 + x2) // 2, (y1 + y2) // 2)
             
-            # Enhanced license plate detection
-            license_plate = ""
-            if enable_plate_detection:
-                license_plate = self.detector.license_plate_detector.detect_license_plate(frame, bbox)
-            
-            repeat_offender = self.detector.logger.is_repeat_offender(license_plate)
+            repeat_offender = bool(license_plate) and is_repeat_offender(license_plate)
             
             # Draw bounding box with enhanced styling
             color = (0, 0, 255) if repeat_offender else (0, 255, 0)
             thickness = 3 if repeat_offender else 2
-            cv2.rectangle(output_frame, (x1, y1), (x2, y2), color, thickness)
+            overlays.append((cv2.rectangle, ((x1, y1), (x2, y2), color, thickness)))
             
             # Create enhanced label with background
             label = f"{vehicle_type} {conf:.2f}"
@@ -107,14 +216,14 @@ class ImageProcessor:
                 label += " [REPEAT OFFENDER]"
             
             # Draw label background for better visibility
-            label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)[0]
-            cv2.rectangle(output_frame, (x1, y1 - 30), (x1 + label_size[0] + 10, y1), color, -1)
-            cv2.putText(output_frame, label, (x1 + 5, y1 - 10), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            label_width = ImageUtils.text_width(label, self._label_advances, 2)
+            overlays.append((cv2.rectangle, ((x1, y1 - 30), (x1 + label_width + 10, y1), color, -1)))
+            overlays.append((cv2.putText, (label, (x1 + 5, y1 - 10), 
+                                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)))
             
             # Check for red light violation
-            if self.detector.violation_line and traffic_light_state == "red":
-                if self.detector.is_crossing_line(center):
+            if check_red_light:
+                if crossing[index]:
                     screenshot_path = self.detector.save_violation_screenshot(
                         frame, bbox, "red_light", timestamp)
                     self.detector.logger.log_violation(
@@ -122,60 +231,77 @@ class ImageProcessor:
                         conf, 0, license_plate, frame_no, 
                         screenshot_path, repeat_offender
                     )
+                    has_violations = True
                     
                     # Enhanced violation visualization
-                    cv2.circle(output_frame, center, 25, (0, 0, 255), -1)
-                    cv2.circle(output_frame, center, 30, (255, 255, 255), 3)
-                    cv2.putText(output_frame, "RED LIGHT VIOLATION", (x1, y2 + 30),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 3)
+                    overlays.append((cv2.circle, (center, 25, (0, 0, 255), -1)))
+                    overlays.append((cv2.circle, (center, 30, (255, 255, 255), 3)))
+                    overlays.append((cv2.putText, ("RED LIGHT VIOLATION", (x1, y2 + 30),
+                                                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 3)))
         
-        return output_frame
+        return has_violations
     
-    def _process_helmet_violations(self, frame, output_frame, person_detections, 
-                                 vehicle_detections, timestamp, frame_no):
-        """Process helmet-related violations with enhanced detection"""
-        import numpy as np
+    def _submit_helmet_checks(self, frame, person_detections, vehicle_detections):
+        """Pair persons with nearby two-wheelers and start their helmet checks on the pool"""
+        # Build the two-wheeler center array once for all persons
+        two_wheelers = [v for v in vehicle_detections if v[0] in Config.TWO_WHEELER_CLASSES]
+        if not two_wheelers or not person_detections:
+            return [], []
+        
+        vehicle_centers = [((v_x1 + v_x2) // 2, (v_y1 + v_y2) // 2)
+                           for _, (v_x1, v_y1, v_x2, v_y2), _ in two_wheelers]
+        person_centers = [((x1 + x2) // 2, (y1 + y2) // 2) for x1, y1, x2, y2 in person_detections]
         
-        for person_bbox in person_detections:
+        # Pair each person with the nearest motorcycle/bicycle in range
+        nearest = GeometryUtils.nearest_within(person_centers, vehicle_centers, Config.NEARBY_VEHICLE_DISTANCE)
+        riders = [(person_bbox, two_wheelers[index][0], two_wheelers[index][1])
+                  for person_bbox, index in zip(person_detections, nearest.tolist()) if index >= 0]
+        
+        detect_helmet = self.detector.helmet_detector.detect_helmet
+        return riders, [self._roi_pool.submit(detect_helmet, frame, rider[0]) for rider in riders]
+    
+    def _process_helmet_violations(self, frame, overlays, riders, helmet_futures, timestamp, frame_no):
+        """Process helmet-related violations with enhanced detection"""
+        # Helmet checks ran concurrently; log and queue draws sequentially
+        has_violations = False
+        for (person_bbox, nearby_vehicle, nearby_bbox), helmet_future in zip(riders, helmet_futures):
             x1, y1, x2, y2 = person_bbox
-            person_center = ((x1 + x2) // 2, (y1 + y2) // 2)
-            
-            # Find nearby motorcycle/bicycle
-            nearby_vehicle = None
-            nearby_bbox = None
-            for vehicle_type, v_bbox, v_conf in vehicle_detections:
-                if vehicle_type in ["motorbike", "bicycle"]:
-                    v_x1, v_y1, v_x2, v_y2 = v_bbox
-                    v_center = ((v_x1 + v_x2) // 2, (v_y1 + v_y2) // 2)
-                    distance = np.sqrt((person_center[0] - v_center[0])**2 + 
-                                     (person_center[1] - v_center[1])**2)
-                    if distance < Config.NEARBY_VEHICLE_DISTANCE:
-                        nearby_vehicle = vehicle_type
-                        nearby_bbox = v_bbox
-                        break
-            
-            if nearby_vehicle:
-                has_helmet = self.detector.helmet_detector.detect_helmet(frame, person_bbox)
+            if not helmet_future.result():
+                screenshot_path = self.detector.save_violation_screenshot(
+                    frame, nearby_bbox, "no_helmet", timestamp)
+                self.detector.logger.log_violation(
+                    timestamp, "no_helmet_violation", nearby_vehicle, 
+                    0.8, 0, "", frame_no, screenshot_path, False
+                )
+                has_violations = True
                 
-                if not has_helmet:
-                    screenshot_path = self.detector.save_violation_screenshot(
-                        frame, nearby_bbox, "no_helmet", timestamp)
-                    self.detector.logger.log_violation(
-                        timestamp, "no_helmet_violation", nearby_vehicle, 
-                        0.8, 0, "", frame_no, screenshot_path, False
-                    )
-                    
-                    # Enhanced helmet violation visualization
-                    cv2.rectangle(output_frame, (x1, y1), (x2, y2), (0, 165, 255), 3)
-                    cv2.rectangle(output_frame, (x1-5, y1-5), (x2+5, y2+5), (255, 255, 255), 2)
-                    
-                    # Add warning icon
-                    cv2.putText(output_frame, "⚠", (x2 + 5, y1 + 20), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 165, 255), 3)
-                    cv2.putText(output_frame, "NO HELMET", (x1, y1 - 10),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 165, 255), 3)
+                # Enhanced helmet violation visualization
+                overlays.append((cv2.rectangle, ((x1, y1), (x2, y2), (0, 165, 255), 3)))
+                overlays.append((cv2.rectangle, ((x1-5, y1-5), (x2+5, y2+5), (255, 255, 255), 2)))
+                
+                # Add warning icon
+                overlays.append((cv2.putText, ("⚠", (x2 + 5, y1 + 20), 
+                                               cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 165, 255), 3)))
+                overlays.append((cv2.putText, ("NO HELMET", (x1, y1 - 10),
+                                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 165, 255), 3)))
         
-        return output_frame
+        return has_violations
+    
+    def _build_line_sprite(self, line):
+        """Pre-render the multi-layered violation line, returning the sprite and its top-left corner"""
+        (x1, y1), (x2, y2) = line
+        margin = 5  # Covers half of the 8px outline
+        left, top = min(x1, x2) - margin, min(y1, y2) - margin
+        start, end = (x1 - left, y1 - top), (x2 - left, y2 - top)
+        
+        def draw(canvas):
+            # Draw multi-layered line for maximum visibility
+            cv2.line(canvas, start, end, (0, 0, 0), 8)      # Black outline
+            cv2.line(canvas, start, end, (255, 255, 0), 6)  # Yellow main
+            cv2.line(canvas, start, end, (255, 255, 255), 2) # White center
+        
+        sprite = ImageUtils.render_sprite(abs(x2 - x1) + 2 * margin + 1, abs(y2 - y1) + 2 * margin + 1, draw)
+        return sprite, (left, top)
     
     def _draw_violation_line(self, output_frame):
         """Draw violation line with enhanced visibility"""
@@ -183,24 +309,17 @@ class ImageProcessor:
         if line:
             (x1, y1), (x2, y2) = line
             
-            # Draw multi-layered line for maximum visibility
-            cv2.line(output_frame, (x1, y1), (x2, y2), (0, 0, 0), 8)      # Black outline
-            cv2.line(output_frame, (x1, y1), (x2, y2), (255, 255, 0), 6)  # Yellow main
-            cv2.line(output_frame, (x1, y1), (x2, y2), (255, 255, 255), 2) # White center
+            cached_line, cached_sprite = self._line_sprite_cache
+            if cached_line != line:
+                cached_sprite = self._build_line_sprite(line)
+                self._line_sprite_cache = (line, cached_sprite)
+            sprite, (left, top) = cached_sprite
+            ImageUtils.blit_sprite(output_frame, sprite, left, top)
             
-            # Add enhanced label
-            label = "VIOLATION LINE"
-            label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2)[0]
+            # Add enhanced label (pre-rendered box, border and text)
             label_x = x1
             label_y = max(30, y1 - 20)
-            
-            # Label background
-            cv2.rectangle(output_frame, (label_x - 5, label_y - 25), 
-                         (label_x + label_size[0] + 5, label_y + 5), (0, 0, 0), -1)
-            cv2.rectangle(output_frame, (label_x - 5, label_y - 25), 
-                         (label_x + label_size[0] + 5, label_y + 5), (255, 255, 0), 2)
-            cv2.putText(output_frame, label, (label_x, label_y - 5),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 0), 2)
+            ImageUtils.blit_sprite(output_frame, self._line_label_sprite, label_x - 6, label_y - 26)
     
     def _add_info_panel(self, output_frame, traffic_light_state, vehicle_count, 
                        person_count, violation_count):
@@ -213,8 +332,8 @@ class ImageProcessor:
         cv2.rectangle(output_frame, (0, 0), (width, panel_height), (255, 255, 255), 3)
         
         # Add title
-        cv2.putText(output_frame, "TRAFFIC VIOLATION DETECTION", (10, 25), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+        ImageUtils.blit_sprite(output_frame, self._title_sprite,
+                               10 - self._title_offset[0], 25 - self._title_offset[1])
         
         # Add detection info
         info_text = f"Traffic Light: {traffic_light_state.upper()} | Vehicles: {vehicle_count} | Persons: {person_count}"
@@ -228,7 +347,7 @@ class ImageProcessor:
                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, violation_color, 2)
         
         # Add timestamp
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        timestamp_size = cv2.getTextSize(timestamp, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)[0]
-        cv2.putText(output_frame, timestamp, (width - timestamp_size[0] - 10, 25), 
+        timestamp = self._current_timestamp()
+        timestamp_width = ImageUtils.text_width(timestamp, self._timestamp_advances, 1)
+        cv2.putText(output_frame, timestamp, (width - timestamp_width - 10, 25), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
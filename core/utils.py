@@ -1,8 +1,64 @@
+import ast
 import os
 import cv2
 import numpy as np
 from typing import Tuple, Optional, List
 
+# Numba compiles the hot geometry kernels when available; plain Python otherwise
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+    
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+@njit(cache=True, fastmath=True)
+def _point_near_line(px, py, x1, y1, x2, y2, tolerance):
+    """Test one point against a line segment's carrier line within tolerance"""
+    # Compare squared distances throughout; the sqrt and divide are not needed for a threshold
+    tolerance_sq = tolerance * tolerance
+    
+    # Vertical line
+    if x1 == x2:
+        dx = px - x1
+        return dx * dx < tolerance_sq
+    
+    # Horizontal line
+    if y1 == y2:
+        dy = py - y1
+        return dy * dy < tolerance_sq
+    
+    # Diagonal line - |Ax + By + C| / sqrt(A^2 + B^2) < tol, squared on both sides
+    A = y2 - y1
+    B = x1 - x2
+    C = x2 * y1 - x1 * y2
+    
+    num = A * px + B * py + C
+    return num * num < tolerance_sq * (A * A + B * B)
+
+@njit(cache=True, fastmath=True)
+def _points_near_line(points, x1, y1, x2, y2, tolerance):
+    """Test every row of an (N, 2) point array against a line"""
+    result = np.zeros(points.shape[0], dtype=np.bool_)
+    for i in range(points.shape[0]):
+        result[i] = _point_near_line(points[i, 0], points[i, 1], x1, y1, x2, y2, tolerance)
+    return result
+
+# libjpeg-turbo encodes JPEGs faster than cv2.imwrite when it is installed
+try:
+    import turbojpeg
+    _turbo_jpeg = turbojpeg.TurboJPEG()
+    _TURBO_OPTIMIZE = getattr(turbojpeg, 'TJFLAG_OPTIMIZE', None)  # Huffman optimisation, in newer bindings only
+    HAS_TURBOJPEG = True
+except Exception:
+    _turbo_jpeg = None
+    _TURBO_OPTIMIZE = None
+    HAS_TURBOJPEG = False
+
 class GeometryUtils:
     @staticmethod
     def calculate_distance(point1: Tuple[int, int], point2: Tuple[int, int]) -> float:
@@ -13,27 +69,52 @@ class GeometryUtils:
     def is_point_near_line(point: Tuple[int, int], line_start: Tuple[int, int], 
                           line_end: Tuple[int, int], tolerance: int = 15) -> bool:
         """Check if a point is near a line within tolerance"""
-        x1, y1 = line_start
-        x2, y2 = line_end
-        px, py = point
-        
-        # Vertical line
-        if x1 == x2:
-            return abs(px - x1) < tolerance
-        
-        # Horizontal line
-        if y1 == y2:
-            return abs(py - y1) < tolerance
+        (x1, y1), (x2, y2) = line_start, line_end
+        return bool(_point_near_line(int(point[0]), int(point[1]), int(x1), int(y1), int(x2), int(y2),
+                                     tolerance))
+    
+    @staticmethod
+    def points_near_line(points: np.ndarray, line_start: Tuple[int, int], 
+                         line_end: Tuple[int, int], tolerance: int = 15) -> np.ndarray:
+        """Check which of an (N, 2) array of points are near a line within tolerance"""
+        (x1, y1), (x2, y2) = line_start, line_end
+        points = np.ascontiguousarray(points, dtype=np.int64).reshape(-1, 2)
+        if HAS_NUMBA:
+            return _points_near_line(points, int(x1), int(y1), int(x2), int(y2), tolerance)
         
-        # Diagonal line - calculate perpendicular distance
-        A = y2 - y1
-        B = x1 - x2
-        C = x2 * y1 - x1 * y2
+        # Without numba the kernel loop runs in Python; evaluate the squared predicate as array ops
+        A, B = int(y2) - int(y1), int(x1) - int(x2)
+        C = int(x2) * int(y1) - int(x1) * int(y2)
+        if A == 0 and B == 0:
+            # Degenerate line: the kernel's vertical-line branch tests the x offset only
+            A, C = 1, -int(x1)
+        num = A * points[:, 0] + B * points[:, 1] + C
+        return num * num < tolerance * tolerance * (A * A + B * B)
+
+    @staticmethod
+    def nearest_within(points: np.ndarray, targets: np.ndarray, max_distance: float) -> np.ndarray:
+        """For each point, return the index of the nearest target within max_distance, or -1"""
+        points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        targets = np.asarray(targets, dtype=np.int64).reshape(-1, 2)
+        if len(points) == 0 or len(targets) == 0:
+            return np.full(len(points), -1, dtype=np.intp)
         
-        distance = abs(A * px + B * py + C) / np.sqrt(A**2 + B**2)
-        return distance < tolerance
+        # (P, V) squared-distance matrix; comparing squares avoids the sqrt
+        deltas = points[:, None, :] - targets[None, :, :]
+        distances_sq = (deltas * deltas).sum(axis=2)
+        nearest = distances_sq.argmin(axis=1)
+        in_range = distances_sq[np.arange(len(points)), nearest] < max_distance * max_distance
+        return np.where(in_range, nearest, -1)
+
+# Characters in a display timestamp that are awkward in file names, replaced in one pass
+_FILENAME_TIMESTAMP_TABLE = str.maketrans({':': '-', ' ': '_', '.': '_'})
 
 class FileUtils:
+    @staticmethod
+    def timestamp_for_filename(timestamp: str) -> str:
+        """Make a timestamp safe to embed in a file name"""
+        return timestamp.translate(_FILENAME_TIMESTAMP_TABLE)
+    
     @staticmethod
     def ensure_directory(directory_path: str) -> str:
         """Ensure directory exists, create if not"""
@@ -65,7 +146,7 @@ class ValidationUtils:
             if not coords_str or coords_str.strip() == "":
                 return None
             
-            coords = eval(coords_str)
+            coords = ast.literal_eval(coords_str)
             if isinstance(coords, list) and len(coords) == 2:
                 # Validate each coordinate is a tuple of 2 integers
                 for coord in coords:
@@ -131,3 +212,106 @@ class ImageUtils:
                    font_scale, (255, 255, 255), thickness)
         
         return image
+    
+    @staticmethod
+    def write_jpeg(file_path: str, image: np.ndarray, quality: int = 85, optimize: bool = False) -> bool:
+        """Encode a BGR image as JPEG and write it, using libjpeg-turbo when available"""
+        # Huffman optimisation costs encode time for a few percent of size; only worth it off the hot path.
+        # Bindings without the optimise flag leave optimised writes to OpenCV
+        if HAS_TURBOJPEG and (not optimize or _TURBO_OPTIMIZE is not None):
+            with open(file_path, 'wb') as f:
+                f.write(_turbo_jpeg.encode(image, quality=quality, flags=_TURBO_OPTIMIZE if optimize else 0))
+            return True
+        
+        return cv2.imwrite(file_path, image,
+                           [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, int(optimize)])
+    
+    @staticmethod
+    def letterbox_into(image: np.ndarray, buffer: np.ndarray,
+                       pad_value: int = 114) -> Tuple[float, int, int, int, int]:
+        """Resize image into a square buffer in place, returning (ratio, pad_x, pad_y, width, height)"""
+        size = buffer.shape[0]
+        height, width = image.shape[:2]
+        ratio = min(size / width, size / height)
+        new_width, new_height = round(width * ratio), round(height * ratio)
+        pad_x, pad_y = (size - new_width) // 2, (size - new_height) // 2
+        
+        # Only the border strips need padding; the resized frame covers the rest
+        buffer[:pad_y] = pad_value
+        buffer[pad_y + new_height:] = pad_value
+        buffer[:, :pad_x] = pad_value
+        buffer[:, pad_x + new_width:] = pad_value
+        buffer[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = cv2.resize(
+            image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+        
+        return ratio, pad_x, pad_y, width, height
+    
+    @staticmethod
+    def fit_to_canvas(image: np.ndarray, width: int, height: int) -> np.ndarray:
+        """Resize image to fit width x height keeping its aspect ratio, zero-padded at the right and bottom"""
+        image_height, image_width = image.shape[:2]
+        ratio = min(width / image_width, height / image_height)
+        new_width = min(width, max(1, round(image_width * ratio)))
+        new_height = min(height, max(1, round(image_height * ratio)))
+        canvas = np.zeros((height, width) + image.shape[2:], dtype=image.dtype)
+        canvas[:new_height, :new_width] = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+        return canvas
+    
+    @staticmethod
+    def scratch_buffer(store, name: str, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """Return a reusable array of shape from store (e.g. a threading.local), growing it on demand"""
+        size = int(np.prod(shape))
+        buffer = getattr(store, name, None)
+        if buffer is None or buffer.size < size or buffer.dtype != dtype:
+            buffer = np.empty(size, dtype=dtype)
+            setattr(store, name, buffer)
+        return buffer[:size].reshape(shape)
+    
+    @staticmethod
+    def apply_overlays(image: np.ndarray, overlays: List[tuple]) -> None:
+        """Run queued (draw function, args) pairs on image in order"""
+        for draw, args in overlays:
+            draw(image, *args)
+    
+    @staticmethod
+    def glyph_advances(font: int, scale: float, thickness: int) -> dict:
+        """Measure each printable ASCII glyph's advance width once for a font setting"""
+        advances = {}
+        for code in range(32, 127):
+            char = chr(code)
+            single = cv2.getTextSize(char, font, scale, thickness)[0][0]
+            double = cv2.getTextSize(char * 2, font, scale, thickness)[0][0]
+            advances[char] = double - single
+        return advances
+    
+    @staticmethod
+    def text_width(text: str, advances: dict, thickness: int) -> int:
+        """Approximate cv2.getTextSize width from a glyph_advances table"""
+        fallback = advances['M']
+        return sum(advances.get(char, fallback) for char in text) + thickness
+    
+    @staticmethod
+    def render_sprite(width: int, height: int, draw) -> Tuple[np.ndarray, np.ndarray]:
+        """Pre-render overlay drawing into an image and mask of drawn pixels"""
+        # Drawing on a black and a white canvas reveals every touched pixel whatever its color
+        dark = np.zeros((height, width, 3), dtype=np.uint8)
+        light = np.full((height, width, 3), 255, dtype=np.uint8)
+        draw(dark)
+        draw(light)
+        mask = np.any(dark != 0, axis=2) | np.any(light != 255, axis=2)
+        return dark, mask
+    
+    @staticmethod
+    def blit_sprite(image: np.ndarray, sprite: Tuple[np.ndarray, np.ndarray], x: int, y: int) -> None:
+        """Copy a pre-rendered sprite onto image at (x, y), clipped to the image bounds"""
+        sprite_image, mask = sprite
+        height, width = image.shape[:2]
+        sprite_height, sprite_width = mask.shape
+        
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(width, x + sprite_width), min(height, y + sprite_height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        
+        region_mask = mask[y0 - y:y1 - y, x0 - x:x1 - x, None]
+        np.copyto(image[y0:y1, x0:x1], sprite_image[y0 - y:y1 - y, x0 - x:x1 - x], where=region_mask)
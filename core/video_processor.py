@@ -1,22 +1,59 @@
 import cv2
 import os
+import queue
+import threading
 import numpy as np
+import torch
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from models.detection_models import ModelManager
+from itertools import compress
+from models.detection_models import ModelManager, BatchedDetector
 from config.settings import Config
+from core.utils import GeometryUtils, ImageUtils
+
+# GPU (NVDEC) decoding is optional; OpenCV's CPU decoder is used otherwise
+try:
+    from torchcodec.decoders import VideoDecoder
+    HAS_NVDEC = True
+except ImportError:
+    HAS_NVDEC = False
 
 class VideoProcessor:
-    def __init__(self, violation_detector):
+    def __init__(self, violation_detector, model_manager=None):
         self.detector = violation_detector
-        self.model_manager = ModelManager()
+        self.model_manager = model_manager or ModelManager()
+        self.batched = BatchedDetector(model_manager=self.model_manager)
         self.vehicle_id_counter = 0
         self.active_vehicles = {}
+        
+        # Per-track detector results: vehicle_id -> (plate, frame), grid cell -> (has_helmet, frame)
+        self.plate_cache = {}
+        self.helmet_cache = {}
+        
+        # Static overlays rendered once and blitted per frame: (key, sprite, (x, y))
+        self._line_overlay = (None, None, None)
+        self._panel_overlay = (None, None, None)
+        
+        # Vehicle label font metrics, measured once instead of per label
+        self._label_advances = ImageUtils.glyph_advances(cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
     
-    def process_video(self, video_path, enable_plate_detection=True):
+    def process_video(self, video_path, enable_plate_detection=True, batch_size=None):
         """Process video for violations with enhanced tracking and timeline markers"""
-        cap = cv2.VideoCapture(video_path)
+        for *result, complete in self.stream_video(video_path, enable_plate_detection, batch_size):
+            if complete:
+                return tuple(result)
+    
+    def stream_video(self, video_path, enable_plate_detection=True, batch_size=None, on_progress=None,
+                     stop_event=None):
+        """Process video, yielding (path, violations, violation_frames, complete) as each segment is encoded"""
+        # batch_size frames go through YOLO per call, at most the batcher's (and TensorRT engine's) maximum;
+        # on_progress(frames_done, total_frames) is called after every batch, and setting stop_event ends
+        # the run after the current batch without a final result
+        # Partial results carry the latest finished preview segment; the last one is the full video
+        cap = self._open_capture(video_path)
         if not cap.isOpened():
-            return None, [], None
+            yield None, [], None, True
+            return
         
         # Video properties
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
@@ -32,192 +69,445 @@ class VideoProcessor:
             auto_line = self.detector.auto_detect_violation_line(first_frame)
             if auto_line:
                 print(f"Auto-detected violation line: {auto_line}")
-        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Reset to beginning
+        
+        # Frame numbers restart with each video, so tracks from a previous run cannot match
+        self.active_vehicles = {}
+        self.plate_cache = {}
+        self.helmet_cache = {}
         
         # Output video setup
         output_path = os.path.join(Config.TEMP_DIR, "processed_video.mp4")
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+        out = self._open_writer(output_path, fps, (width, height))
         
-        yolo_model = self.model_manager.get_yolo_model()
         frame_count = 0
         violation_frames = []  # Store frame numbers with violations
         start_time = datetime.now()
         
+        # Decode and encode on background threads so they overlap with detection
+        read_q = queue.Queue(maxsize=Config.VIDEO_PREFETCH)
+        write_q = queue.Queue(maxsize=Config.VIDEO_PREFETCH)
+        stop_reading = threading.Event()
+        if ret:
+            # Hand the already-decoded first frame to the pipeline instead of seeking back
+            read_q.put(first_frame)
+        if Config.USE_NVDEC and HAS_NVDEC and torch.cuda.is_available():
+            reader = threading.Thread(target=self._nvdec_reader_loop,
+                                      args=(video_path, cap, read_q, stop_reading, 1 if ret else 0), daemon=True)
+        else:
+            reader = threading.Thread(target=self._reader_loop, args=(cap, read_q, stop_reading), daemon=True)
+        # The writer also cuts short preview segments the client can play while the rest is processed
+        segment_q = queue.Queue()
+        segments = (segment_q, fps, (width, height)) if Config.VIDEO_STREAM_SEGMENT_FRAMES > 0 else None
+        writer = threading.Thread(target=self._writer_loop, args=(out, write_q, segments), daemon=True)
+        reader.start()
+        writer.start()
+        inference_pool = ThreadPoolExecutor(max_workers=1)
+        
         try:
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                # Calculate current timestamp
-                current_time = start_time + timedelta(seconds=frame_count/fps)
-                timestamp = current_time.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-                
-                output_frame = frame.copy()
+            batch_size = min(int(batch_size or self.batched.max_batch_size), self.batched.max_batch_size)
+            
+            # Frames are letterboxed into this reusable input block; one batch is in flight at a time
+            input_size = Config.YOLO_INPUT_SIZE
+            letterbox_buffers = np.zeros((batch_size, input_size, input_size, 3), dtype=np.uint8)
+            
+            # Run detection on every stride-th frame; the others reuse the last result
+            stride = max(1, Config.DETECTION_STRIDE)
+            current_detections, traffic_light_state, overlays = {}, "unknown", []
+            
+            # Read a batch of frames and run YOLO on them in one call
+            frames, end_of_video = self._read_frames(read_q, batch_size)
+            pending = inference_pool.submit(
+                self._detect_batch, frames, letterbox_buffers, 0, stride) if frames else None
+            frames_submitted = len(frames)
+            while pending is not None:
+                batch_frames, batch_detections = frames, pending.result()
                 
-                # Run YOLO detection
-                results = yolo_model(frame)[0]
-                current_detections = {}
-                person_detections = []
-                traffic_lights = []
+                # Start inference on the next batch while this one is annotated
+                pending = None
+                if not end_of_video:
+                    frames, end_of_video = self._read_frames(read_q, batch_size)
+                    if frames:
+                        pending = inference_pool.submit(
+                            self._detect_batch, frames, letterbox_buffers, frames_submitted, stride)
+                        frames_submitted += len(frames)
                 
-                # Parse detections
-                for box in results.boxes:
-                    cls_name = yolo_model.names[int(box.cls[0])]
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    conf = float(box.conf[0])
+                for frame, detections in zip(batch_frames, batch_detections):
+                    # Calculate current timestamp
+                    current_time = start_time + timedelta(seconds=frame_count/fps)
+                    timestamp = current_time.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
                     
-                    if cls_name in ["car", "truck", "bus", "motorbike", "bicycle"] and conf > Config.VEHICLE_CONFIDENCE_THRESHOLD:
-                        center = ((x1 + x2) // 2, (y1 + y2) // 2)
-                        
-                        # Assign vehicle ID based on proximity to previous detections
-                        vehicle_id = self._assign_vehicle_id(center, frame_count)
-                        
-                        current_detections[vehicle_id] = {
-                            'type': cls_name, 'bbox': (x1, y1, x2, y2), 
-                            'center': center, 'conf': conf
-                        }
-                    elif cls_name == "person" and conf > Config.PERSON_CONFIDENCE_THRESHOLD:
-                        person_detections.append((x1, y1, x2, y2))
-                    elif cls_name == "traffic light" and conf > Config.TRAFFIC_LIGHT_CONFIDENCE_THRESHOLD:
-                        traffic_lights.append((x1, y1, x2, y2))
-                
-                # Detect traffic light state
-                traffic_light_state = self._detect_traffic_light_state(frame, traffic_lights)
-                
-                # Process vehicle violations
-                has_violations = self._process_vehicles(
-                    frame, output_frame, current_detections,
-                    traffic_light_state, timestamp, frame_count, fps, enable_plate_detection
-                )
-                
-                # Process helmet violations
-                helmet_violations = self._process_helmet_violations(
-                    frame, output_frame, person_detections, current_detections, timestamp, frame_count
-                )
-                
-                # Track violation frames for timeline markers
-                if has_violations or helmet_violations:
-                    violation_frames.append(frame_count)
-                
-                # Draw violation line with enhanced visibility
-                self._draw_violation_line(output_frame)
-                
-                # Add enhanced frame info
-                self._add_frame_info(output_frame, frame_count, total_frames, traffic_light_state, 
-                                   len(current_detections), len(violation_frames))
-                
-                # Add timeline markers for violations (enhanced visibility)
-                if frame_count in violation_frames:
-                    self._add_violation_marker(output_frame, width, height)
+                    if detections is not None:
+                        current_detections, traffic_light_state, overlays, frame_has_violations = \
+                            self._analyze_frame(frame, detections, timestamp, current_time.timestamp(),
+                                                frame_count, fps / stride, enable_plate_detection)
+                    else:
+                        # Frame skipped by DETECTION_STRIDE: redraw the last analysed frame's state
+                        frame_has_violations = False
+                    
+                    # All reads are done, so annotate the decoded buffer in place instead of copying it
+                    output_frame = frame
+                    ImageUtils.apply_overlays(output_frame, overlays)
+                    
+                    # Track violation frames for timeline markers
+                    if frame_has_violations:
+                        violation_frames.append(frame_count)
+                    
+                    # Draw violation line with enhanced visibility
+                    self._draw_violation_line(output_frame)
+                    
+                    # Add enhanced frame info
+                    self._add_frame_info(output_frame, frame_count, total_frames, traffic_light_state, 
+                                       len(current_detections), len(violation_frames))
+                    
+                    # Add timeline markers for violations (enhanced visibility)
+                    if frame_count in violation_frames:
+                        self._add_violation_marker(output_frame, width, height)
+                    
+                    write_q.put(output_frame)
+                    frame_count += 1
+                    
+                    # Periodically drop tracks that have left the scene
+                    if frame_count % Config.TRACK_PRUNE_INTERVAL == 0:
+                        self._prune_tracks(frame_count)
+                    
+                    # Progress indicator
+                    if frame_count % 30 == 0:  # Every 30 frames
+                        progress = (frame_count / total_frames) * 100
+                        print(f"Processing: {progress:.1f}% ({frame_count}/{total_frames})")
                 
-                out.write(output_frame)
-                frame_count += 1
+                if on_progress is not None:
+                    on_progress(frame_count, total_frames)
+                if stop_event is not None and stop_event.is_set():
+                    return
                 
-                # Progress indicator
-                if frame_count % 30 == 0:  # Every 30 frames
-                    progress = (frame_count / total_frames) * 100
-                    print(f"Processing: {progress:.1f}% ({frame_count}/{total_frames})")
+                # Hand over any preview segment the writer has finished since the last batch
+                segment_path = None
+                while not segment_q.empty():
+                    segment_path = segment_q.get_nowait()
+                if segment_path:
+                    yield segment_path, self.detector.logger.get_violations_dataframe(), violation_frames, False
                 
         finally:
+            inference_pool.shutdown(wait=True)
+            
+            # Stop the reader, draining the queue so a blocked put can return
+            stop_reading.set()
+            while reader.is_alive():
+                try:
+                    read_q.get(timeout=0.1)
+                except queue.Empty:
+                    pass
             cap.release()
-            out.release()
             
-            # Clean up old vehicle tracks
-            current_vehicle_ids = list(current_detections.keys()) if 'current_detections' in locals() else []
-            self.detector.speed_calculator.clear_old_tracks(current_vehicle_ids)
+            # Let the writer flush remaining frames before closing the file
+            write_q.put(None)
+            writer.join()
+            out.release()
+        
+        # Clean up old vehicle tracks
+        self.detector.speed_calculator.clear_old_tracks(list(current_detections.keys()))
+        
+        # Screenshots are written in the background; make sure the gallery can read them
+        self.detector.logger.wait_for_screenshots()
         
         print(f"Video processing complete. Found {len(violation_frames)} violation frames.")
-        return output_path, self.detector.logger.get_violations_dataframe(), violation_frames
+        yield output_path, self.detector.logger.get_violations_dataframe(), violation_frames, True
+    
+    def _detect_batch(self, frames, letterbox_buffers, first_index=0, stride=1):
+        """Letterbox a frame batch, run YOLO on it and parse boxes back to frame coordinates"""
+        # Frames off the detection stride get None and reuse the previous detections
+        selected = [i for i in range(len(frames)) if (first_index + i) % stride == 0]
+        detections = [None] * len(frames)
+        if not selected:
+            return detections
+        
+        inputs = list(letterbox_buffers[:len(selected)])
+        letterboxes = [ImageUtils.letterbox_into(frames[i], buffer) for i, buffer in zip(selected, inputs)]
+        parsed = self.model_manager.parse_detections_batch(self.batched.infer_batch(inputs), letterboxes)
+        for i, frame_detections in zip(selected, parsed):
+            detections[i] = frame_detections
+        return detections
+    
+    def _analyze_frame(self, frame, detections, timestamp, frame_time, frame_count, fps,
+                       enable_plate_detection):
+        """Track vehicles and check violations on one frame, queueing its overlay draws"""
+        vehicle_detections, person_detections, traffic_lights = detections
+        
+        # Struct-of-arrays view of the vehicles for the vectorized line and rider checks
+        bboxes = np.array([bbox for _, bbox, _ in vehicle_detections], dtype=np.int32).reshape(-1, 4)
+        centers = (bboxes[:, :2] + bboxes[:, 2:]) // 2
+        center_tuples = [tuple(center) for center in centers.tolist()]
+        
+        # Assign vehicle IDs based on proximity to previous detections
+        vehicle_ids = self._assign_vehicle_ids(center_tuples, frame_count)
+        
+        # Several boxes can match one track; the last one wins, as in current_detections
+        keep = sorted({vehicle_id: index for index, vehicle_id in enumerate(vehicle_ids)}.values())
+        current_detections = {}
+        for index in keep:
+            cls_name, bbox, conf = vehicle_detections[index]
+            current_detections[vehicle_ids[index]] = {
+                'type': cls_name, 'bbox': bbox, 
+                'center': center_tuples[index], 'conf': conf
+            }
+        vehicle_arrays = {
+            'centers': centers[keep],
+            'two_wheeler': np.array([vehicle_detections[index][0] in Config.TWO_WHEELER_CLASSES
+                                     for index in keep], dtype=bool),
+        }
+        
+        # Detect traffic light state
+        traffic_light_state = self._detect_traffic_light_state(frame, traffic_lights)
+        
+        # Detectors and screenshots read the clean frame; their drawing is queued
+        overlays = []
+        
+        # Process vehicle violations
+        has_violations = self._process_vehicles(
+            frame, overlays, current_detections, vehicle_arrays,
+            traffic_light_state, timestamp, frame_time, frame_count, fps, enable_plate_detection
+        )
+        
+        # Process helmet violations
+        helmet_violations = self._process_helmet_violations(
+            frame, overlays, person_detections, current_detections, vehicle_arrays, timestamp, frame_count
+        )
+        
+        return current_detections, traffic_light_state, overlays, has_violations or helmet_violations
+    
+    def _open_capture(self, video_path):
+        """Open a video with FFmpeg multi-threaded decoding where OpenCV supports it"""
+        threads_prop = getattr(cv2, 'CAP_PROP_N_THREADS', None)
+        if threads_prop is not None:
+            try:
+                cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG, [threads_prop, Config.VIDEO_CODEC_THREADS])
+                if cap.isOpened():
+                    return cap
+            except Exception as e:
+                print(f"Threaded FFmpeg capture unavailable: {e}")
+        return cv2.VideoCapture(video_path)
+    
+    def _open_writer(self, output_path, fps, frame_size):
+        """Open an H.264 writer with threaded encoding, falling back to the default codec"""
+        threads_prop = getattr(cv2, 'VIDEOWRITER_PROP_N_THREADS', None)
+        params = [threads_prop, Config.VIDEO_CODEC_THREADS] if threads_prop is not None else []
+        try:
+            out = cv2.VideoWriter(output_path, cv2.CAP_FFMPEG, cv2.VideoWriter_fourcc(*Config.VIDEO_CODEC),
+                                  fps, frame_size, params)
+            if out.isOpened():
+                return out
+            out.release()
+        except Exception as e:
+            print(f"{Config.VIDEO_CODEC} writer unavailable: {e}")
+        
+        fourcc = cv2.VideoWriter_fourcc(*Config.VIDEO_FALLBACK_CODEC)
+        return cv2.VideoWriter(output_path, fourcc, fps, frame_size)
+    
+    def _reader_loop(self, cap, read_q, stop_reading):
+        """Decode frames into the read queue until the video ends or stop is requested"""
+        try:
+            while not stop_reading.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                read_q.put(frame)
+        except Exception as e:
+            print(f"Video reader error: {e}")
+        finally:
+            read_q.put(None)  # End-of-video sentinel
     
-    def _assign_vehicle_id(self, center, frame_count):
-        """Assign vehicle ID based on proximity to existing vehicles"""
-        min_distance = float('inf')
-        assigned_id = None
-        
-        # Check proximity to existing vehicles
-        for vehicle_id, vehicle_data in self.active_vehicles.items():
-            if frame_count - vehicle_data['last_seen'] < 10:  # Vehicle seen in last 10 frames
-                distance = np.sqrt((center[0] - vehicle_data['center'][0])**2 + 
-                                 (center[1] - vehicle_data['center'][1])**2)
-                if distance < min_distance and distance < 50:  # Within 50 pixels
-                    min_distance = distance
-                    assigned_id = vehicle_id
-        
-        # Create new vehicle ID if no match found
-        if assigned_id is None:
-            assigned_id = self.vehicle_id_counter
-            self.vehicle_id_counter += 1
-        
-        # Update vehicle tracking
-        self.active_vehicles[assigned_id] = {
-            'center': center,
-            'last_seen': frame_count
+    def _nvdec_reader_loop(self, video_path, cap, read_q, stop_reading, start_index):
+        """Decode frames with NVDEC from start_index, queueing BGR host copies for annotation"""
+        try:
+            decoder = VideoDecoder(video_path, device="cuda")
+        except Exception as e:
+            # cap is already positioned at start_index, so the CPU reader carries on seamlessly
+            print(f"NVDEC unavailable, decoding on CPU: {e}")
+            return self._reader_loop(cap, read_q, stop_reading)
+        
+        try:
+            for index in range(start_index, len(decoder)):
+                if stop_reading.is_set():
+                    break
+                # (3, H, W) RGB on the GPU; convert to HWC BGR there, then copy down for annotation.
+                # YOLO re-uploads the letterboxed frame, which is why this path is off by default
+                frame = decoder[index]
+                read_q.put(frame.flip(0).permute(1, 2, 0).contiguous().cpu().numpy())
+        except Exception as e:
+            print(f"NVDEC reader error: {e}")
+        finally:
+            read_q.put(None)  # End-of-video sentinel
+    
+    def _writer_loop(self, out, write_q, segments=None):
+        """Encode frames from the write queue until the sentinel arrives, optionally cutting preview segments"""
+        segment, segment_path, segment_index, segment_frames = None, None, 0, 0
+        while True:
+            frame = write_q.get()
+            if frame is None:
+                break
+            try:
+                out.write(frame)
+                
+                if segments:
+                    segment_q, fps, frame_size = segments
+                    if segment is None:
+                        # Each segment gets its own file, so the client can still be reading the previous one
+                        segment_path = os.path.join(Config.TEMP_DIR, f"processed_video_part{segment_index}.mp4")
+                        segment = self._open_writer(segment_path, fps, frame_size)
+                        segment_index += 1
+                    segment.write(frame)
+                    segment_frames += 1
+                    
+                    if segment_frames >= Config.VIDEO_STREAM_SEGMENT_FRAMES:
+                        segment.release()
+                        segment_q.put(segment_path)
+                        segment, segment_frames = None, 0
+            except Exception as e:
+                print(f"Video writer error: {e}")
+        
+        # The tail is covered by the full video, which follows as the final result
+        if segment is not None:
+            segment.release()
+    
+    def _read_frames(self, read_q, count):
+        """Take up to count decoded frames from the read queue"""
+        frames = []
+        while len(frames) < count:
+            frame = read_q.get()
+            if frame is None:
+                return frames, True
+            frames.append(frame)
+        return frames, False
+    
+    def _assign_vehicle_ids(self, centers, frame_count):
+        """Assign vehicle IDs for a frame's centers based on proximity to existing vehicles"""
+        # Match all centers against vehicles seen in the last 10 frames in one nearest-neighbour pass
+        recent = [(vehicle_id, vehicle_data['center']) for vehicle_id, vehicle_data in self.active_vehicles.items()
+                  if frame_count - vehicle_data['last_seen'] < 10]
+        nearest = GeometryUtils.nearest_within(
+            centers, [center for _, center in recent], 50)  # Within 50 pixels
+        
+        assigned_ids = []
+        for center, index in zip(centers, nearest.tolist()):
+            if index >= 0:
+                assigned_id = recent[index][0]
+            else:
+                # Create new vehicle ID if no match found
+                assigned_id = self.vehicle_id_counter
+                self.vehicle_id_counter += 1
+            
+            # Update vehicle tracking, keeping prev_center for the speed estimate
+            vehicle_data = self.active_vehicles.setdefault(assigned_id, {})
+            vehicle_data['center'] = center
+            vehicle_data['last_seen'] = frame_count
+            assigned_ids.append(assigned_id)
+        
+        return assigned_ids
+    
+    def _prune_tracks(self, frame_count):
+        """Forget vehicles unseen for TRACK_MAX_AGE frames, along with their speed tracks"""
+        self.active_vehicles = {
+            vehicle_id: vehicle_data for vehicle_id, vehicle_data in self.active_vehicles.items()
+            if frame_count - vehicle_data['last_seen'] < Config.TRACK_MAX_AGE
         }
+        self.detector.speed_calculator.clear_old_tracks(list(self.active_vehicles.keys()))
         
-        return assigned_id
+        # Evict detector results for departed vehicles and expired helmet cells
+        self.plate_cache = {
+            vehicle_id: entry for vehicle_id, entry in self.plate_cache.items() if vehicle_id in self.active_vehicles
+        }
+        self.helmet_cache = {
+            key: entry for key, entry in self.helmet_cache.items()
+            if frame_count - entry[1] <= Config.DETECTOR_RECHECK_FRAMES
+        }
     
     def _detect_traffic_light_state(self, frame, traffic_lights):
         """Detect traffic light state"""
-        for light_bbox in traffic_lights:
-            state = self.detector.traffic_light_detector.detect_color(frame, light_bbox)
-            if state != "unknown":
-                return state
-        return "unknown"
+        # Classify every light in one pass, then take the first with a known color
+        states = self.detector.traffic_light_detector.detect_colors(frame, traffic_lights)
+        return next((state for state in states if state != "unknown"), "unknown")
     
-    def _process_vehicles(self, frame, output_frame, current_detections,
-                         traffic_light_state, timestamp, frame_count, fps, enable_plate_detection):
+    def _process_vehicles(self, frame, overlays, current_detections, vehicle_arrays,
+                         traffic_light_state, timestamp, frame_time, frame_count, fps, enable_plate_detection):
         """Process vehicle detections and violations"""
         has_violations = False
         
+        # Bind per-call lookups once rather than per vehicle
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        speed_limit = Config.SPEED_LIMIT_KMH
+        active_vehicles = self.active_vehicles
+        detect_license_plates = self.detector.license_plate_detector.detect_license_plates
+        plate_cache = self.plate_cache
+        recheck_frames = Config.DETECTOR_RECHECK_FRAMES
+        is_repeat_offender = self.detector.logger.is_repeat_offender
+        label_advances = self._label_advances
+        
+        # Test every vehicle against the violation line at once during red lights
+        check_red_light = self.detector.violation_line and traffic_light_state == "red"
+        crossing = self.detector.crossing_mask(vehicle_arrays['centers']) if check_red_light else None
+        
+        # Re-read only plates whose cached value has expired, in one batched OCR call per frame
+        if enable_plate_detection:
+            stale_ids, stale_bboxes = [], []
+            for vehicle_id, detection in current_detections.items():
+                cached = plate_cache.get(vehicle_id)
+                if cached is None or frame_count - cached[1] > recheck_frames:
+                    stale_ids.append(vehicle_id)
+                    stale_bboxes.append(detection['bbox'])
+            if stale_ids:
+                for vehicle_id, plate in zip(stale_ids, detect_license_plates(frame, stale_bboxes, stale_ids)):
+                    plate_cache[vehicle_id] = (plate, frame_count)
+        
+        # Speeds of every vehicle with a previous position, in one batched call
+        moving_ids, prev_centers, curr_centers = [], [], []
         for vehicle_id, detection in current_detections.items():
+            prev_center = active_vehicles.get(vehicle_id, {}).get('prev_center')
+            if prev_center:
+                moving_ids.append(vehicle_id)
+                prev_centers.append(prev_center)
+                curr_centers.append(detection['center'])
+        speeds = dict(zip(moving_ids, self.detector.speed_calculator.calculate_speeds_enhanced_batch(
+            moving_ids, prev_centers, curr_centers, fps, frame_timestamp=frame_time)))
+        
+        for index, (vehicle_id, detection) in enumerate(current_detections.items()):
             vehicle_type = detection['type']
             bbox = detection['bbox']
             center = detection['center']
             conf = detection['conf']
             x1, y1, x2, y2 = bbox
             
-            # License plate detection
-            license_plate = ""
-            if enable_plate_detection:
-                license_plate = self.detector.license_plate_detector.detect_license_plate(frame, bbox)
+            # License plate detection, reusing this track's plate for a few frames
+            license_plate = plate_cache[vehicle_id][0] if enable_plate_detection else ""
             
-            repeat_offender = self.detector.logger.is_repeat_offender(license_plate)
+            repeat_offender = bool(license_plate) and is_repeat_offender(license_plate)
             
             # Speed calculation with vehicle ID tracking
-            speed = 0
-            if vehicle_id in self.active_vehicles:
-                prev_center = self.active_vehicles[vehicle_id].get('prev_center')
-                if prev_center:
-                    speed = self.detector.speed_calculator.calculate_speed(
-                        vehicle_id, prev_center, center, fps, frame_timestamp=datetime.now().timestamp()
-                    )
-                    
-                    # Check for speeding violation
-                    if speed > Config.SPEED_LIMIT_KMH:
-                        screenshot_path = self.detector.save_violation_screenshot(
-                            frame, bbox, "speeding", timestamp)
-                        self.detector.logger.log_violation(
-                            timestamp, "speeding_violation", vehicle_type, 
-                            conf, speed, license_plate, frame_count, 
-                            screenshot_path, repeat_offender
-                        )
-                        has_violations = True
-                        
-                        # Enhanced speeding violation display
-                        cv2.putText(output_frame, f"SPEEDING: {speed:.1f} km/h", (x1, y2 + 40),
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 0, 0), 3)
-                        cv2.rectangle(output_frame, (x1-5, y1-5), (x2+5, y2+5), (255, 0, 0), 3)
+            speed = speeds.get(vehicle_id, 0)
+            
+            # Check for speeding violation
+            if speed > speed_limit:
+                screenshot_path = self.detector.save_violation_screenshot(
+                    frame, bbox, "speeding", timestamp)
+                self.detector.logger.log_violation(
+                    timestamp, "speeding_violation", vehicle_type, 
+                    conf, speed, license_plate, frame_count, 
+                    screenshot_path, repeat_offender
+                )
+                has_violations = True
+                
+                # Enhanced speeding violation display
+                overlays.append((cv2.putText, (f"SPEEDING: {speed:.1f} km/h", (x1, y2 + 40),
+                                               font, 0.8, (255, 0, 0), 3)))
+                overlays.append((cv2.rectangle, ((x1-5, y1-5), (x2+5, y2+5), (255, 0, 0), 3)))
             
             # Update vehicle tracking
-            if vehicle_id in self.active_vehicles:
-                self.active_vehicles[vehicle_id]['prev_center'] = center
+            if vehicle_id in active_vehicles:
+                active_vehicles[vehicle_id]['prev_center'] = center
             
             # Draw bounding box with enhanced colors
             color = (0, 0, 255) if repeat_offender else (0, 255, 0)
             thickness = 3 if repeat_offender else 2
-            cv2.rectangle(output_frame, (x1, y1), (x2, y2), color, thickness)
+            overlays.append((cv2.rectangle, ((x1, y1), (x2, y2), color, thickness)))
             
             # Create enhanced label
             label = f"{vehicle_type} {conf:.2f}"
@@ -229,14 +519,14 @@ class VideoProcessor:
                 label += " [REPEAT]"
             
             # Draw label with background for better visibility
-            label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)[0]
-            cv2.rectangle(output_frame, (x1, y1 - 25), (x1 + label_size[0], y1), color, -1)
-            cv2.putText(output_frame, label, (x1, y1 - 10), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            label_width = ImageUtils.text_width(label, label_advances, 2)
+            overlays.append((cv2.rectangle, ((x1, y1 - 25), (x1 + label_width, y1), color, -1)))
+            overlays.append((cv2.putText, (label, (x1, y1 - 10), 
+                                           font, 0.6, (255, 255, 255), 2)))
             
             # Check for red light violation
-            if self.detector.violation_line and traffic_light_state == "red":
-                if self.detector.is_crossing_line(center):
+            if check_red_light:
+                if crossing[index]:
                     screenshot_path = self.detector.save_violation_screenshot(
                         frame, bbox, "red_light", timestamp)
                     self.detector.logger.log_violation(
@@ -247,36 +537,45 @@ class VideoProcessor:
                     has_violations = True
                     
                     # Enhanced red light violation display
-                    cv2.circle(output_frame, center, 20, (0, 0, 255), -1)
-                    cv2.putText(output_frame, "RED LIGHT VIOLATION", (x1, y2 + 25),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 3)
+                    overlays.append((cv2.circle, (center, 20, (0, 0, 255), -1)))
+                    overlays.append((cv2.putText, ("RED LIGHT VIOLATION", (x1, y2 + 25),
+                                                   font, 0.8, (0, 0, 255), 3)))
         
         return has_violations
     
-    def _process_helmet_violations(self, frame, output_frame, person_detections, 
-                                 current_detections, timestamp, frame_count):
+    def _process_helmet_violations(self, frame, overlays, person_detections, 
+                                 current_detections, vehicle_arrays, timestamp, frame_count):
         """Process helmet violations"""
         has_violations = False
         
-        for person_bbox in person_detections:
+        two_wheeler_mask = vehicle_arrays['two_wheeler']
+        if not two_wheeler_mask.any() or not person_detections:
+            return has_violations
+        
+        # Pair every person with the nearest motorcycle/bicycle in one distance matrix
+        two_wheelers = list(compress(current_detections.values(), two_wheeler_mask.tolist()))
+        person_boxes = np.array(person_detections, dtype=np.int32)
+        person_centers = (person_boxes[:, :2] + person_boxes[:, 2:]) // 2
+        nearest = GeometryUtils.nearest_within(
+            person_centers, vehicle_arrays['centers'][two_wheeler_mask], Config.NEARBY_VEHICLE_DISTANCE)
+        
+        detect_helmet = self.detector.helmet_detector.detect_helmet
+        helmet_cache = self.helmet_cache
+        cell = Config.HELMET_CACHE_CELL
+        for person_bbox, vehicle_index in zip(person_detections, nearest.tolist()):
             x1, y1, x2, y2 = person_bbox
-            person_center = ((x1 + x2) // 2, (y1 + y2) // 2)
-            
-            # Find nearby motorcycle/bicycle
-            nearby_vehicle = None
-            nearby_bbox = None
-            for detection in current_detections.values():
-                if detection['type'] in ["motorbike", "bicycle"]:
-                    v_center = detection['center']
-                    distance = np.sqrt((person_center[0] - v_center[0])**2 + 
-                                     (person_center[1] - v_center[1])**2)
-                    if distance < Config.NEARBY_VEHICLE_DISTANCE:
-                        nearby_vehicle = detection['type']
-                        nearby_bbox = detection['bbox']
-                        break
-            
-            if nearby_vehicle:
-                has_helmet = self.detector.helmet_detector.detect_helmet(frame, person_bbox)
+            if vehicle_index >= 0:
+                nearby_vehicle = two_wheelers[vehicle_index]['type']
+                nearby_bbox = two_wheelers[vehicle_index]['bbox']
+                
+                # Riders barely move between frames, so key the result by a coarse position cell
+                cache_key = ((x1 + x2) // 2 // cell, (y1 + y2) // 2 // cell)
+                cached = helmet_cache.get(cache_key)
+                if cached is not None and frame_count - cached[1] <= Config.DETECTOR_RECHECK_FRAMES:
+                    has_helmet = cached[0]
+                else:
+                    has_helmet = detect_helmet(frame, person_bbox)
+                    helmet_cache[cache_key] = (has_helmet, frame_count)
                 
                 if not has_helmet:
                     screenshot_path = self.detector.save_violation_screenshot(
@@ -288,9 +587,9 @@ class VideoProcessor:
                     has_violations = True
                     
                     # Enhanced helmet violation display
-                    cv2.rectangle(output_frame, (x1, y1), (x2, y2), (0, 165, 255), 3)
-                    cv2.putText(output_frame, "NO HELMET", (x1, y1 - 10),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 165, 255), 3)
+                    overlays.append((cv2.rectangle, ((x1, y1), (x2, y2), (0, 165, 255), 3)))
+                    overlays.append((cv2.putText, ("NO HELMET", (x1, y1 - 10),
+                                                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 165, 255), 3)))
         
         return has_violations
     
@@ -298,31 +597,56 @@ class VideoProcessor:
         """Draw violation line with enhanced visibility"""
         line = self.detector.get_violation_line_for_display()
         if line:
-            (x1, y1), (x2, y2) = line
+            overlay = self._line_overlay if self._line_overlay[0] == line else self._build_line_overlay(line)
+            _, sprite, (left, top) = overlay
+            ImageUtils.blit_sprite(output_frame, sprite, left, top)
+    
+    def _build_line_overlay(self, line):
+        """Pre-render the violation line and its label into one cached sprite"""
+        (x1, y1), (x2, y2) = line
+        label = "VIOLATION LINE"
+        label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)[0]
+        label_x = x1
+        label_y = y1 - 20
+        
+        # Sprite bounds cover the 7px line and the label box above its start point
+        margin = 5
+        left = min(x1, x2) - margin
+        top = min(y1, y2, label_y - 20) - margin
+        right = max(x1, x2, label_x + label_size[0]) + margin
+        bottom = max(y1, y2) + margin
+        
+        def shift(x, y):
+            return (x - left, y - top)
+        
+        def draw(canvas):
             # Draw thicker line with multiple colors for better visibility
-            cv2.line(output_frame, (x1, y1), (x2, y2), (0, 0, 0), 7)  # Black outline
-            cv2.line(output_frame, (x1, y1), (x2, y2), (255, 255, 0), 5)  # Yellow line
-            cv2.line(output_frame, (x1, y1), (x2, y2), (255, 255, 255), 1)  # White center
+            cv2.line(canvas, shift(x1, y1), shift(x2, y2), (0, 0, 0), 7)  # Black outline
+            cv2.line(canvas, shift(x1, y1), shift(x2, y2), (255, 255, 0), 5)  # Yellow line
+            cv2.line(canvas, shift(x1, y1), shift(x2, y2), (255, 255, 255), 1)  # White center
             
             # Add label with background
-            label = "VIOLATION LINE"
-            label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)[0]
-            label_x = x1
-            label_y = y1 - 20
-            cv2.rectangle(output_frame, (label_x, label_y - 20), 
-                         (label_x + label_size[0], label_y), (0, 0, 0), -1)
-            cv2.putText(output_frame, label, (label_x, label_y - 5),
+            cv2.rectangle(canvas, shift(label_x, label_y - 20), 
+                         shift(label_x + label_size[0], label_y), (0, 0, 0), -1)
+            cv2.putText(canvas, label, shift(label_x, label_y - 5),
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
+        
+        self._line_overlay = (line, ImageUtils.render_sprite(right - left + 1, bottom - top + 1, draw), (left, top))
+        return self._line_overlay
     
     def _add_frame_info(self, output_frame, frame_count, total_frames, traffic_light_state, 
                        vehicle_count, violation_count):
         """Add enhanced frame information"""
         height, width = output_frame.shape[:2]
         
-        # Create info panel background
+        # Info panel background, pre-rendered once per frame width
         info_height = 80
-        cv2.rectangle(output_frame, (0, 0), (width, info_height), (0, 0, 0), -1)
-        cv2.rectangle(output_frame, (0, 0), (width, info_height), (255, 255, 255), 2)
+        if self._panel_overlay[0] != width:
+            def draw(canvas):
+                cv2.rectangle(canvas, (0, 0), (width, info_height), (0, 0, 0), -1)
+                cv2.rectangle(canvas, (0, 0), (width, info_height), (255, 255, 255), 2)
+            self._panel_overlay = (width, ImageUtils.render_sprite(width, info_height + 2, draw), (0, 0))
+        ImageUtils.blit_sprite(output_frame, self._panel_overlay[1], 0, 0)
         
         # Add information text
         info_lines = [
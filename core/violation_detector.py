@@ -1,8 +1,12 @@
+import ast
+import itertools
 import os
+import re
 import cv2
 import numpy as np
 from datetime import datetime
 from config.settings import Config
+from core.utils import FileUtils, GeometryUtils
 from detectors.traffic_light import TrafficLightDetector
 from detectors.helmet import HelmetDetector
 from detectors.license_plate import LicensePlateDetector
@@ -17,15 +21,23 @@ except ImportError:
     print("ViolationLineDetector not found, using fallback auto-detection")
     HAS_AUTO_DETECTION = False
 
+# Suffix for temp screenshot names, shared by every detector so concurrent screenshots never collide
+_screenshot_ids = itertools.count()
+
+# Fast path for the documented "[(x1,y1), (x2,y2)]" form (brackets or parentheses per point)
+_LINE_RE = re.compile(
+    r'\[\s*[\[(]\s*(-?\d+)\s*,\s*(-?\d+)\s*[\])]\s*,\s*[\[(]\s*(-?\d+)\s*,\s*(-?\d+)\s*[\])]\s*\]$')
+
 class ViolationDetector:
-    def __init__(self):
+    def __init__(self, logger=None):
         self.violation_line = None
         self.auto_detected_line = None
         self.traffic_light_detector = TrafficLightDetector()
         self.helmet_detector = HelmetDetector()
         self.license_plate_detector = LicensePlateDetector()
         self.speed_calculator = SpeedCalculator()
-        self.logger = ViolationLogger()
+        # Detectors for different pipelines may share one logger, and with it the log and CSV
+        self.logger = logger or ViolationLogger()
         
         # Initialize line detector if available
         if HAS_AUTO_DETECTION:
@@ -33,6 +45,10 @@ class ViolationDetector:
         else:
             self.line_detector = None
         
+        # Last auto-detected scene, so a static camera does not repeat line detection
+        self._line_cache_signature = None
+        self._line_cache_uses = 0
+        
         # Ensure temp directory exists
         Config.ensure_temp_dir()
     
@@ -40,22 +56,64 @@ class ViolationDetector:
         """Set the violation line coordinates manually"""
         self.violation_line = (point1, point2)
         self.auto_detected_line = None  # Clear auto-detected line when manual is set
+        self.invalidate_line_cache()
+    
+    def clear_violation_line(self):
+        """Drop the current line so the next auto-detection sets one; its cached detection is kept"""
+        self.violation_line = None
     
-    def auto_detect_violation_line(self, frame):
-        """Automatically detect violation line from frame"""
+    def auto_detect_violation_line(self, frame, scale=1):
+        """Automatically detect violation line from frame, a 1/scale downsampled view of the scene"""
+        # The crossing is fixed relative to the camera; reuse the last line while the scene is unchanged
+        signature = self._frame_signature(frame, scale)
+        if self._line_cache_hit(signature):
+            self._line_cache_uses += 1
+            if not self.violation_line:
+                self.violation_line = (tuple(self.auto_detected_line[0]), tuple(self.auto_detected_line[1]))
+            return self.auto_detected_line
+        
         if not self.line_detector:
             # Fallback auto-detection
-            return self._simple_auto_detect(frame)
+            detected_line = self._simple_auto_detect(frame)
+        else:
+            detected_line = self.line_detector.detect_zebra_crossing(frame, scale)
         
-        detected_line = self.line_detector.detect_zebra_crossing(frame)
         if detected_line:
+            # Report the line in full-resolution coordinates
+            if scale != 1:
+                detected_line = [(int(x * scale), int(y * scale)) for x, y in detected_line]
             self.auto_detected_line = detected_line
             # If no manual line is set, use the auto-detected one
             if not self.violation_line:
                 self.violation_line = (tuple(detected_line[0]), tuple(detected_line[1]))
+            
+            self._line_cache_signature = signature
+            self._line_cache_uses = 0
             return detected_line
+        self.invalidate_line_cache()
         return None
     
+    def invalidate_line_cache(self):
+        """Force the next auto-detection to analyse its frame, e.g. after the camera moves"""
+        self._line_cache_signature = None
+        self._line_cache_uses = 0
+    
+    def _frame_signature(self, frame, scale=1):
+        """Summarise a frame as its size, scale and a coarse grayscale thumbnail for change detection"""
+        thumbnail = cv2.resize(frame, (32, 18), interpolation=cv2.INTER_AREA)
+        return (frame.shape[:2], scale), cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY)
+    
+    def _line_cache_hit(self, signature):
+        """Check whether the cached auto-detected line still applies to a frame signature"""
+        if self.auto_detected_line is None or self._line_cache_signature is None:
+            return False
+        if self._line_cache_uses >= Config.LINE_CACHE_TTL:
+            return False
+        
+        (shape, thumbnail), (cached_shape, cached_thumbnail) = signature, self._line_cache_signature
+        return shape == cached_shape and \
+            cv2.absdiff(thumbnail, cached_thumbnail).mean() < Config.LINE_CACHE_DIFF_THRESHOLD
+    
     def _simple_auto_detect(self, frame):
         """Simple fallback auto-detection"""
         try:
@@ -65,10 +123,6 @@ class ViolationDetector:
             line_start = (50, line_y)
             line_end = (width - 50, line_y)
             
-            self.auto_detected_line = [line_start, line_end]
-            if not self.violation_line:
-                self.violation_line = (line_start, line_end)
-            
             return [line_start, line_end]
         except Exception as e:
             print(f"Error in simple auto-detection: {e}")
@@ -79,7 +133,13 @@ class ViolationDetector:
         try:
             if not line_coords or line_coords.strip() == "":
                 return None
-            coords = eval(line_coords)
+            match = _LINE_RE.match(line_coords.strip())
+            if match:
+                x1, y1, x2, y2 = map(int, match.groups())
+                return [(x1, y1), (x2, y2)]
+            
+            # Literals only; user input is never executed
+            coords = ast.literal_eval(line_coords.strip())
             if isinstance(coords, list) and len(coords) == 2:
                 return coords
         except Exception as e:
@@ -91,26 +151,21 @@ class ViolationDetector:
         if not self.violation_line:
             return False
         
-        (x1, y1), (x2, y2) = self.violation_line
-        vx, vy = vehicle_center
+        line_start, line_end = self.violation_line
+        return GeometryUtils.is_point_near_line(
+            vehicle_center, line_start, line_end, Config.LINE_CROSSING_TOLERANCE)
+    
+    def crossing_mask(self, vehicle_centers):
+        """Check several vehicle centers against the violation line in one call"""
+        if not self.violation_line or len(vehicle_centers) == 0:
+            return np.zeros(len(vehicle_centers), dtype=bool)
         
-        # Calculate distance from point to line
-        if x1 == x2:  # Vertical line
-            distance = abs(vx - x1)
-            return distance < Config.LINE_CROSSING_TOLERANCE
-        elif y1 == y2:  # Horizontal line
-            distance = abs(vy - y1)
-            return distance < Config.LINE_CROSSING_TOLERANCE
-        else:  # Diagonal line
-            # Calculate perpendicular distance from point to line
-            A = y2 - y1
-            B = x1 - x2
-            C = x2 * y1 - x1 * y2
-            distance = abs(A * vx + B * vy + C) / np.sqrt(A**2 + B**2)
-            return distance < Config.LINE_CROSSING_TOLERANCE
+        line_start, line_end = self.violation_line
+        return GeometryUtils.points_near_line(
+            np.asarray(vehicle_centers), line_start, line_end, Config.LINE_CROSSING_TOLERANCE)
     
     def save_violation_screenshot(self, frame, vehicle_bbox, violation_type, timestamp):
-        """Save screenshot of violation"""
+        """Save screenshot of violation in the background, returning its path"""
         try:
             x1, y1, x2, y2 = vehicle_bbox
             margin = 20
@@ -119,14 +174,14 @@ class ViolationDetector:
             x2 = min(frame.shape[1], x2 + margin)
             y2 = min(frame.shape[0], y2 + margin)
             
-            cropped = frame[y1:y2, x1:x2]
+            # Copy the crop so later drawing on the frame cannot leak into it
+            cropped = frame[y1:y2, x1:x2].copy()
             
-            timestamp_clean = timestamp.replace(':', '-').replace(' ', '_')
-            filename = f"violation_{violation_type}_{timestamp_clean}.jpg"
+            timestamp_clean = FileUtils.timestamp_for_filename(timestamp)
+            filename = f"violation_{violation_type}_{timestamp_clean}_{next(_screenshot_ids)}.jpg"
             filepath = os.path.join(Config.TEMP_DIR, filename)
             
-            cv2.imwrite(filepath, cropped)
-            return filepath
+            return self.logger.write_screenshot_async(filepath, cropped)
         except Exception as e:
             print(f"Error saving screenshot: {e}")
             return ""
@@ -145,8 +200,5 @@ class ViolationDetector:
     
     def reset_session(self):
         """Reset the current session data"""
-        self.logger.violations_log = []
-        if hasattr(self.speed_calculator, 'vehicle_tracks'):
-            self.speed_calculator.vehicle_tracks = {}
-        if hasattr(self.speed_calculator, 'frame_timestamps'):
-            self.speed_calculator.frame_timestamps = {}
+        self.logger.reset_log()
+        self.speed_calculator.reset()
@@ -1,12 +1,19 @@
-import os
-import matplotlib.pyplot as plt
+import threading
 from collections import defaultdict
-from config.settings import Config
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# One Agg figure reused for every render, bypassing pyplot's global state
+_FIG = Figure(figsize=(15, 6), dpi=150)
+_CANVAS = FigureCanvasAgg(_FIG)
+_AX1, _AX2 = _FIG.subplots(1, 2)
+_FIG_LOCK = threading.Lock()  # The shared figure is redrawn by concurrent requests
 
 class ViolationDashboard:
     @staticmethod
     def create_dashboard(violations_log):
-        """Create violation dashboard charts"""
+        """Create violation dashboard charts as an RGB image array"""
         if not violations_log:
             return None
             
@@ -14,10 +21,23 @@ class ViolationDashboard:
         for violation in violations_log:
             violation_counts[violation['violation_type']] += 1
         
+        return ViolationDashboard.create_dashboard_from_counts(violation_counts)
+    
+    @staticmethod
+    def create_dashboard_from_counts(violation_counts):
+        """Create violation dashboard charts from per-type counts (in first-seen order)"""
         if not violation_counts:
             return None
-            
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
+        
+        with _FIG_LOCK:
+            return ViolationDashboard._render(violation_counts)
+    
+    @staticmethod
+    def _render(violation_counts):
+        """Redraw the shared figure from violation counts and copy out its pixels"""
+        ax1, ax2 = _AX1, _AX2
+        ax1.clear()
+        ax2.clear()
         
         violations = list(violation_counts.keys())
         counts = list(violation_counts.values())
@@ -45,10 +65,8 @@ class ViolationDashboard:
                     ha='center', va='center', transform=ax2.transAxes, fontsize=14)
             ax2.set_title('Violation Distribution')
         
-        plt.tight_layout()
-        
-        chart_path = os.path.join(Config.TEMP_DIR, "violation_dashboard.png")
-        plt.savefig(chart_path, dpi=150, bbox_inches='tight')
-        plt.close()
+        _FIG.tight_layout()
         
-        return chart_path
+        # Rasterize in memory; the UI takes the array directly, so no PNG is written and read back
+        _CANVAS.draw()
+        return np.asarray(_CANVAS.buffer_rgba())[..., :3].copy()
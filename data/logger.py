@@ -1,31 +1,76 @@
+import csv
+import itertools
 import os
 import pandas as pd
 import shutil
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 from config.settings import Config
+from core.utils import FileUtils, ImageUtils
+
+# pyarrow parses the CSV log much faster than pandas when it is installed
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Suffix for persistent screenshot names; timestamps have one-second resolution and images share frame 0
+_screenshot_ids = itertools.count()
+
+# Returned whenever the display table is empty; callers only read it, so one instance is shared
+_EMPTY_DF = pd.DataFrame()
 
 class ViolationLogger:
+    CSV_HEADERS = [
+        'timestamp', 'violation_type', 'vehicle_type', 'confidence',
+        'speed', 'license_plate', 'frame_no', 'screenshot_path',
+        'repeat_offender', 'screenshot_display'
+    ]
+    
+    # Columns shown in the UI table, in display order
+    DISPLAY_COLUMNS = [
+        'timestamp', 'violation_type', 'vehicle_type', 
+        'license_plate', 'speed', 'confidence', 'repeat_offender', 'frame_no'
+    ]
+    
     def __init__(self):
         self.violations_log = []
+        self._saved_count = 0  # Leading entries of violations_log already in the CSV
+        self._csv_fieldnames = None  # Header of the CSV as last read or written
+        
+        # Image and video pipelines log, save and clear concurrently; guards the log and CSV state
+        self._lock = threading.RLock()
+        
+        # Display rows formatted so far and the last built table: (entries covered, rows, DataFrame)
+        self._display_cache = (0, None, None)
         self.csv_file = Config.CSV_LOG_FILE
         self.screenshot_dir = os.path.join(Config.TEMP_DIR, "violation_screenshots")
         
+        # Background writer so screenshot encoding stays off the detection loop
+        self._io_pool = ThreadPoolExecutor(max_workers=2)
+        self._pending_screenshots = {}
+        self._pending_copies = []
+        
         # Ensure directories exist
         Config.ensure_temp_dir()
         os.makedirs(self.screenshot_dir, exist_ok=True)
         
         # Initialize CSV with headers if it doesn't exist
         self._initialize_csv()
+        
+        # Plates and summary counts for what is on record, so checks and summaries skip re-reading the CSV
+        self._known_plates = set()
+        self._reset_csv_stats()
+        self._load_csv_state()
     
     def _initialize_csv(self):
         """Initialize CSV file with proper headers if it doesn't exist"""
         if not os.path.exists(self.csv_file):
-            headers = [
-                'timestamp', 'violation_type', 'vehicle_type', 'confidence',
-                'speed', 'license_plate', 'frame_no', 'screenshot_path',
-                'repeat_offender'
-            ]
-            df = pd.DataFrame(columns=headers)
+            df = pd.DataFrame(columns=self.CSV_HEADERS)
             try:
                 df.to_csv(self.csv_file, index=False)
             except Exception as e:
@@ -34,165 +79,315 @@ class ViolationLogger:
     def log_violation(self, timestamp, violation_type, vehicle_type, confidence, 
                      speed, license_plate, frame_no, screenshot_path, repeat_offender):
         """Log a violation to memory"""
-        
-        # Copy screenshot to persistent location if it exists
-        screenshot_display_path = ""
-        if screenshot_path and os.path.exists(screenshot_path):
-            try:
+        with self._lock:
+            # Copy screenshot to persistent location once it has been written
+            screenshot_display_path = ""
+            pending_write = self._pending_screenshots.pop(screenshot_path, None)
+            if pending_write is not None or (screenshot_path and os.path.exists(screenshot_path)):
                 # Create a unique filename
-                timestamp_clean = timestamp.replace(':', '-').replace(' ', '_').replace('.', '_')
-                screenshot_filename = f"{violation_type}_{timestamp_clean}_{frame_no}.jpg"
+                timestamp_clean = FileUtils.timestamp_for_filename(timestamp)
+                screenshot_filename = f"{violation_type}_{timestamp_clean}_{frame_no}_{next(_screenshot_ids)}.jpg"
                 persistent_screenshot_path = os.path.join(self.screenshot_dir, screenshot_filename)
                 
-                shutil.copy2(screenshot_path, persistent_screenshot_path)
-                screenshot_display_path = persistent_screenshot_path
-            except Exception as e:
-                print(f"Error copying screenshot: {e}")
-                screenshot_display_path = screenshot_path
+                if pending_write is not None:
+                    # Writes are queued ahead of their copies, so the copy never waits on a starved write
+                    self._pending_copies.append(self._io_pool.submit(
+                        self._copy_when_written, pending_write, screenshot_path, persistent_screenshot_path))
+                    screenshot_display_path = persistent_screenshot_path
+                elif self._copy_screenshot(screenshot_path, persistent_screenshot_path):
+                    screenshot_display_path = persistent_screenshot_path
+                else:
+                    screenshot_display_path = screenshot_path
+            
+            violation = {
+                'timestamp': timestamp,
+                'violation_type': violation_type,
+                'vehicle_type': vehicle_type,
+                'confidence': round(confidence, 3),
+                'speed': round(speed, 1) if speed > 0 else 0,
+                'license_plate': license_plate if license_plate else "N/A",
+                'frame_no': frame_no,
+                'screenshot_path': screenshot_path,
+                'repeat_offender': repeat_offender,
+                'screenshot_display': screenshot_display_path
+            }
+            self.violations_log.append(violation)
+    
+    def write_screenshot_async(self, screenshot_path, image):
+        """Queue a screenshot for writing on the background I/O pool"""
+        with self._lock:
+            self._pending_screenshots[screenshot_path] = self._io_pool.submit(
+                self._write_screenshot, screenshot_path, image)
+            return screenshot_path
+    
+    def wait_for_screenshots(self):
+        """Block until every queued screenshot write and copy has finished"""
+        with self._lock:
+            pending = list(self._pending_screenshots.values()) + self._pending_copies
+            self._pending_copies = []
+        wait(pending)
+    
+    def _write_screenshot(self, screenshot_path, image):
+        """Encode and write a screenshot to disk"""
+        try:
+            # Encoding runs on the I/O pool, so spend the time on smaller files
+            return ImageUtils.write_jpeg(screenshot_path, image, Config.JPEG_QUALITY, optimize=True)
+        except Exception as e:
+            print(f"Error writing screenshot: {e}")
+            return False
+    
+    def _copy_when_written(self, pending_write, screenshot_path, persistent_screenshot_path):
+        """Copy a screenshot once its background write has completed"""
+        if pending_write.result():
+            return self._copy_screenshot(screenshot_path, persistent_screenshot_path)
+        return False
+    
+    def _copy_screenshot(self, screenshot_path, persistent_screenshot_path):
+        """Copy a written screenshot into the persistent screenshot directory"""
+        try:
+            # A hardlink moves no data; copy the bytes (without metadata) across devices
+            try:
+                os.link(screenshot_path, persistent_screenshot_path)
+            except OSError:
+                shutil.copyfile(screenshot_path, persistent_screenshot_path)
+            return True
+        except Exception as e:
+            print(f"Error copying screenshot: {e}")
+            return False
+    
+    def _load_csv_state(self):
+        """Scan the CSV log once for its known plates and summary counts"""
+        try:
+            if os.path.exists(self.csv_file):
+                row_count, columns = self._read_csv_columns(
+                    ['license_plate', 'violation_type', 'repeat_offender', 'timestamp'])
+                plates = [p for p in columns.get('license_plate', []) if not self._is_missing(p)]
+                self._known_plates = {str(p).strip() for p in plates}
+                self._total_violations = row_count
+                self._violation_counts = Counter(
+                    v for v in columns.get('violation_type', []) if not self._is_missing(v))
+                self._repeat_count = sum(1 for v in columns.get('repeat_offender', []) if v == True)
+                timestamps = [str(t) for t in columns.get('timestamp', []) if not self._is_missing(t)]
+                self._latest_timestamp = max(timestamps) if timestamps else None
+        except Exception as e:
+            print(f"Error loading violation log state: {e}")
+    
+    def _read_csv_columns(self, names):
+        """Read the named columns that exist in the CSV log as lists, with the row count"""
+        header = self._read_csv_header()
+        names = [name for name in names if name in header]
+        if HAS_PYARROW:
+            # Keep text columns as strings; pyarrow would otherwise parse timestamps and plates
+            text_types = {name: pa.string() for name in names if name != 'repeat_offender'}
+            table = pacsv.read_csv(self.csv_file, convert_options=pacsv.ConvertOptions(
+                include_columns=names, column_types=text_types))
+            return table.num_rows, {name: table.column(name).to_pylist() for name in names}
         
-        violation = {
-            'timestamp': timestamp,
-            'violation_type': violation_type,
-            'vehicle_type': vehicle_type,
-            'confidence': round(confidence, 3),
-            'speed': round(speed, 1) if speed > 0 else 0,
-            'license_plate': license_plate if license_plate else "N/A",
-            'frame_no': frame_no,
-            'screenshot_path': screenshot_path,
-            'repeat_offender': repeat_offender,
-            'screenshot_display': screenshot_display_path
-        }
-        self.violations_log.append(violation)
+        df = pd.read_csv(self.csv_file, usecols=names)
+        return len(df), {name: df[name].tolist() for name in names}
+    
+    @staticmethod
+    def _is_missing(value):
+        """Check for an empty CSV cell as either reader reports it (None or NaN)"""
+        return value is None or value != value
+    
+    def _reset_csv_stats(self):
+        """Zero the running summary of the CSV log"""
+        self._total_violations = 0
+        self._violation_counts = Counter()
+        self._repeat_count = 0
+        self._latest_timestamp = None
+        self._exported_count = None  # Rows in the CSV when the download copy was last written
+    
+    def _record_saved_rows(self, rows):
+        """Fold rows just appended to the CSV into the known plates and summary counts"""
+        for row in rows:
+            self._known_plates.add(str(row['license_plate']).strip())
+            self._total_violations += 1
+            self._violation_counts[row['violation_type']] += 1
+            self._repeat_count += bool(row['repeat_offender'])
+            if self._latest_timestamp is None or row['timestamp'] > self._latest_timestamp:
+                self._latest_timestamp = row['timestamp']
     
     def is_repeat_offender(self, license_plate):
         """Check if license plate has previous violations"""
         if not license_plate or license_plate == "" or license_plate == "N/A":
             return False
         
-        try:
-            if os.path.exists(self.csv_file):
-                df = pd.read_csv(self.csv_file)
-                if 'license_plate' in df.columns:
-                    # Check if license plate exists in previous records
-                    existing_plates = df['license_plate'].astype(str).str.strip()
-                    return license_plate.strip() in existing_plates.values
-            return False
-        except Exception as e:
-            print(f"Error checking repeat offender: {e}")
-            return False
+        # Check if license plate exists in previous records
+        return license_plate.strip() in self._known_plates
     
     def save_violations_to_csv(self):
-        """Save violations to CSV file"""
-        if not self.violations_log:
-            return self.csv_file if os.path.exists(self.csv_file) else None
-        
-        try:
-            new_df = pd.DataFrame(self.violations_log)
-            
-            # Load existing data if file exists
-            if os.path.exists(self.csv_file):
-                try:
-                    existing_df = pd.read_csv(self.csv_file)
-                    # Ensure compatibility with existing CSV structure
-                    for col in new_df.columns:
-                        if col not in existing_df.columns:
-                            existing_df[col] = ""
-                    for col in existing_df.columns:
-                        if col not in new_df.columns:
-                            new_df[col] = ""
-                    
-                    combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-                except Exception as e:
-                    print(f"Error reading existing CSV: {e}")
-                    combined_df = new_df
-            else:
-                combined_df = new_df
+        """Append violations not yet saved to the CSV file"""
+        with self._lock:
+            new_rows = self.violations_log[self._saved_count:]
+            if not new_rows:
+                return self.csv_file if os.path.exists(self.csv_file) else None
             
-            # Sort by timestamp (most recent first)
-            if 'timestamp' in combined_df.columns:
-                combined_df = combined_df.sort_values('timestamp', ascending=False)
-            
-            # Save to CSV
-            combined_df.to_csv(self.csv_file, index=False)
-            return self.csv_file
+            try:
+                # The header only changes through this logger, so it is read once while the file exists
+                fieldnames = self._csv_fieldnames if os.path.exists(self.csv_file) else None
+                if not fieldnames:
+                    fieldnames = self._read_csv_header()
+                write_header = not fieldnames
+                if write_header:
+                    fieldnames = self.CSV_HEADERS
+                elif any(col not in fieldnames for col in self.CSV_HEADERS):
+                    fieldnames = self._upgrade_csv_header()
+                self._csv_fieldnames = fieldnames
+                
+                # Only the new rows touch disk, in one buffered write for a long video's worth of rows
+                with open(self.csv_file, 'a', newline='', buffering=Config.CSV_WRITE_BUFFER) as f:
+                    writer = csv.DictWriter(f, fieldnames=fieldnames, restval="", extrasaction='ignore')
+                    if write_header:
+                        writer.writeheader()
+                    writer.writerows(new_rows)
+                
+                self._saved_count = len(self.violations_log)
+                self._record_saved_rows(new_rows)
+                return self.csv_file
+                
+            except Exception as e:
+                print(f"Error saving violations to CSV: {e}")
+                return None
+    
+    def export_violations_csv(self):
+        """Save new violations and return a newest-first copy of the CSV log for download"""
+        with self._lock:
+            csv_path = self.save_violations_to_csv()
+            if csv_path is None:
+                return None
             
-        except Exception as e:
-            print(f"Error saving violations to CSV: {e}")
-            return None
+            # The log file is append-ordered; the copy is re-sorted only after rows were added
+            export_file = Config.CSV_EXPORT_FILE
+            try:
+                if self._exported_count != self._total_violations or not os.path.exists(export_file):
+                    df = pd.read_csv(self.csv_file, dtype=str, keep_default_na=False)
+                    if 'timestamp' in df.columns:
+                        df = df.iloc[::-1].sort_values('timestamp', ascending=False, kind='stable')
+                    df.to_csv(export_file, index=False)
+                    self._exported_count = self._total_violations
+                return export_file
+            except Exception as e:
+                print(f"Error exporting violations CSV: {e}")
+                return csv_path
+    
+    def _read_csv_header(self):
+        """Return the CSV file's column names, or an empty list if it is missing or empty"""
+        if not os.path.exists(self.csv_file):
+            return []
+        with open(self.csv_file, newline='') as f:
+            return next(csv.reader(f), [])
+    
+    def _upgrade_csv_header(self):
+        """Rewrite a CSV from an older layout once so it carries every current column"""
+        existing_df = pd.read_csv(self.csv_file)
+        for col in self.CSV_HEADERS:
+            if col not in existing_df.columns:
+                existing_df[col] = ""
+        existing_df.to_csv(self.csv_file, index=False)
+        return list(existing_df.columns)
+    
+    def reset_log(self):
+        """Forget the in-memory violations of this session"""
+        with self._lock:
+            self.violations_log = []
+            self._saved_count = 0
+            self._display_cache = (0, None, None)
     
     def clear_violations_csv(self):
         """Clear all violations from CSV but keep the file structure"""
-        try:
-            # Keep only the headers
-            headers = [
-                'timestamp', 'violation_type', 'vehicle_type', 'confidence',
-                'speed', 'license_plate', 'frame_no', 'screenshot_path',
-                'repeat_offender'
-            ]
-            df = pd.DataFrame(columns=headers)
-            df.to_csv(self.csv_file, index=False)
-            
-            # Clear in-memory log as well
-            self.violations_log = []
-            
-            # Optionally clear screenshot directory
+        with self._lock:
             try:
-                if os.path.exists(self.screenshot_dir):
-                    shutil.rmtree(self.screenshot_dir)
-                    os.makedirs(self.screenshot_dir, exist_ok=True)
+                # Keep only the headers
+                df = pd.DataFrame(columns=self.CSV_HEADERS)
+                df.to_csv(self.csv_file, index=False)
+                self._csv_fieldnames = list(self.CSV_HEADERS)
+                
+                # Clear in-memory log as well
+                self.reset_log()
+                self._known_plates = set()
+                self._reset_csv_stats()
+                
+                # Optionally clear screenshot directory
+                try:
+                    if os.path.exists(self.screenshot_dir):
+                        shutil.rmtree(self.screenshot_dir)
+                        os.makedirs(self.screenshot_dir, exist_ok=True)
+                except Exception as e:
+                    print(f"Warning: Could not clear screenshot directory: {e}")
+                
+                return True
             except Exception as e:
-                print(f"Warning: Could not clear screenshot directory: {e}")
-            
-            return True
-        except Exception as e:
-            print(f"Error clearing violations CSV: {e}")
-            return False
+                print(f"Error clearing violations CSV: {e}")
+                return False
     
     def get_violations_dataframe(self):
         """Get violations as pandas DataFrame for UI display"""
-        if not self.violations_log:
-            return pd.DataFrame()
-        
-        try:
-            df = pd.DataFrame(self.violations_log)
-            
-            # Reorder columns for better display
-            display_columns = [
-                'timestamp', 'violation_type', 'vehicle_type', 
-                'license_plate', 'speed', 'confidence', 'repeat_offender', 'frame_no'
-            ]
+        with self._lock:
+            if not self.violations_log:
+                return _EMPTY_DF
             
-            # Only include columns that exist
-            available_columns = [col for col in display_columns if col in df.columns]
-            df_display = df[available_columns].copy()
-            
-            # Format for better readability
-            if 'confidence' in df_display.columns:
-                df_display['confidence'] = df_display['confidence'].round(3)
-            if 'speed' in df_display.columns:
-                df_display['speed'] = df_display['speed'].apply(lambda x: f"{x:.1f} km/h" if x > 0 else "N/A")
-            if 'repeat_offender' in df_display.columns:
-                df_display['repeat_offender'] = df_display['repeat_offender'].apply(lambda x: "Yes" if x else "No")
-            
-            return df_display
-        except Exception as e:
-            print(f"Error creating violations dataframe: {e}")
-            return pd.DataFrame()
+            try:
+                # The log only grows, so only entries added since the last call are formatted
+                count, rows, df_display = self._display_cache
+                if count == len(self.violations_log):
+                    return df_display
+                new_rows = [self._display_row(violation) for violation in self.violations_log[count:]]
+                
+                if HAS_PYARROW:
+                    # Append the new rows as one more chunk and convert without per-column dtype inference
+                    chunk = pa.Table.from_pylist(new_rows, schema=self._display_schema())
+                    rows = chunk if rows is None else pa.concat_tables([rows, chunk])
+                    df_display = rows.to_pandas(types_mapper=pd.ArrowDtype)
+                else:
+                    rows = (rows or []) + new_rows
+                    df_display = pd.DataFrame.from_records(rows, columns=self.DISPLAY_COLUMNS)
+                
+                # Most recent first; the log is appended in time order, so reversing leaves little to sort
+                df_display = df_display.iloc[::-1].sort_values(
+                    'timestamp', ascending=False, kind='stable', ignore_index=True)
+                
+                self._display_cache = (len(self.violations_log), rows, df_display)
+                return df_display
+            except Exception as e:
+                print(f"Error creating violations dataframe: {e}")
+                return _EMPTY_DF
+    
+    def _display_row(self, violation):
+        """Format one logged violation for the UI table"""
+        # Format for better readability
+        speed = violation['speed']
+        return {
+            'timestamp': violation['timestamp'],
+            'violation_type': violation['violation_type'],
+            'vehicle_type': violation['vehicle_type'],
+            'license_plate': violation['license_plate'],
+            'speed': f"{speed:.1f} km/h" if speed > 0 else "N/A",
+            'confidence': round(violation['confidence'], 3),
+            'repeat_offender': "Yes" if violation['repeat_offender'] else "No",
+            'frame_no': violation['frame_no'],
+        }
+    
+    @staticmethod
+    def _display_schema():
+        """Arrow schema of the UI table, so every appended chunk has the same column types"""
+        text = pa.string()
+        return pa.schema([
+            ('timestamp', text), ('violation_type', text), ('vehicle_type', text),
+            ('license_plate', text), ('speed', text), ('confidence', pa.float64()),
+            ('repeat_offender', text), ('frame_no', pa.int64())
+        ])
     
     def get_csv_summary(self):
         """Get summary statistics from the CSV file"""
-        try:
-            if os.path.exists(self.csv_file):
-                df = pd.read_csv(self.csv_file)
-                if len(df) > 0:
-                    summary = {
-                        'total_violations': len(df),
-                        'violation_types': df['violation_type'].value_counts().to_dict() if 'violation_type' in df.columns else {},
-                        'repeat_offenders': len(df[df['repeat_offender'] == True]) if 'repeat_offender' in df.columns else 0,
-                        'latest_violation': df.iloc[0]['timestamp'] if 'timestamp' in df.columns else "N/A"
-                    }
-                    return summary
-            return {'total_violations': 0, 'violation_types': {}, 'repeat_offenders': 0, 'latest_violation': 'N/A'}
-        except Exception as e:
-            print(f"Error getting CSV summary: {e}")
-            return {'total_violations': 0, 'violation_types': {}, 'repeat_offenders': 0, 'latest_violation': 'N/A'}
+        with self._lock:
+            # Counters are loaded with the CSV and advanced on every save, so no re-read is needed
+            if self._total_violations == 0:
+                return {'total_violations': 0, 'violation_types': {}, 'repeat_offenders': 0, 'latest_violation': 'N/A'}
+            return {
+                'total_violations': self._total_violations,
+                'violation_types': dict(self._violation_counts),
+                'repeat_offenders': self._repeat_count,
+                'latest_violation': self._latest_timestamp if self._latest_timestamp is not None else "N/A"
+            }
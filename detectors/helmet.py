@@ -1,8 +1,97 @@
+import time
 import cv2
 import numpy as np
 from config.settings import Config
+from core.utils import HAS_NUMBA, njit
+
+# OpenCV's fixed-point tables for 8-bit BGR2HSV (hsv_shift = 12, rounded half to even like
+# saturate_cast): S = (diff * _SDIV[V] + 2048) >> 12, H = (sector offset * _HDIV[diff] + 2048) >> 12
+_HSV_SHIFT = 12
+_DIVISORS = np.maximum(np.arange(256, dtype=np.float64), 1)
+_SDIV = np.where(np.arange(256) > 0, np.rint((255 << _HSV_SHIFT) / _DIVISORS), 0).astype(np.int64)
+_HDIV = np.where(np.arange(256) > 0, np.rint((180 << _HSV_SHIFT) / (6 * _DIVISORS)), 0).astype(np.int64)
+
+# Serial: crops are small and already checked concurrently from the ROI pool and video workers
+@njit(cache=True)
+def _count_helmet_pixels(bgr):
+    """Count head-region pixels in any helmet color range (dark, bright, blue), straight from BGR"""
+    height, width = bgr.shape[0], bgr.shape[1]
+    half = 1 << (_HSV_SHIFT - 1)
+    total = 0
+    for row in range(height):
+        count = 0
+        for col in range(width):
+            b, g, r = int(bgr[row, col, 0]), int(bgr[row, col, 1]), int(bgr[row, col, 2])
+            
+            # S and H use OpenCV's integer arithmetic, so counts match cv2.cvtColor + inRange exactly
+            v = max(b, g, r)
+            diff = v - min(b, g, r)
+            s = (diff * _SDIV[v] + half) >> _HSV_SHIFT
+            if v <= 50:
+                count += 1  # Dark: V <= 50
+            elif s <= 50 and v >= 100:
+                count += 1  # Bright: S <= 50, V >= 100
+            elif s >= 50 and b == v and r != v and g != v:
+                # Blue: H in [100, 130] only occurs in OpenCV's blue-max sector (R and G below B)
+                h = ((r - g + 4 * diff) * _HDIV[diff] + half) >> _HSV_SHIFT
+                if 100 <= h <= 130:
+                    count += 1
+        total += count
+    return total
+
+# Helmet color ranges in OpenCV HSV: dark, bright, blue
+HELMET_COLOR_RANGES = [
+    ((0, 0, 0), (180, 255, 50)),
+    ((0, 0, 100), (180, 50, 255)),
+    ((100, 50, 50), (130, 255, 255))
+]
 
 class HelmetDetector:
+    _use_opencl = False  # Set once by the startup benchmark; shared by all detector instances
+    
+    def __init__(self):
+        # Pay the JIT compile (or cache load) once up front rather than on the first rider
+        if HAS_NUMBA:
+            _count_helmet_pixels(np.zeros((1, 1, 3), dtype=np.uint8))
+        elif cv2.ocl.haveOpenCL():
+            HelmetDetector._use_opencl = self._opencl_is_faster()
+    
+    @staticmethod
+    def _opencl_is_faster():
+        """Time the OpenCL and NumPy color counts on a large synthetic crop"""
+        sample = np.random.default_rng(0).integers(0, 256, (256, 256, 3), dtype=np.uint8)
+        try:
+            HelmetDetector._count_opencl(sample)  # Kernel compilation is not part of the timing
+            timings = []
+            for count in (HelmetDetector._count_opencl, HelmetDetector._count_numpy):
+                start = time.perf_counter()
+                for _ in range(5):
+                    count(sample)
+                timings.append(time.perf_counter() - start)
+            return timings[0] < timings[1]
+        except cv2.error as e:
+            print(f"OpenCL helmet path unavailable: {e}")
+            return False
+    
+    @staticmethod
+    def _count_opencl(head_region):
+        """Count helmet-colored pixels with OpenCL (T-API) kernels"""
+        hsv = cv2.cvtColor(cv2.UMat(head_region), cv2.COLOR_BGR2HSV)
+        mask = None
+        for lower, upper in HELMET_COLOR_RANGES:
+            range_mask = cv2.inRange(hsv, lower, upper)
+            mask = range_mask if mask is None else cv2.bitwise_or(mask, range_mask)
+        return cv2.countNonZero(mask)
+    
+    @staticmethod
+    def _count_numpy(head_region):
+        """Count helmet-colored pixels with one fused NumPy pass over the H, S, V planes"""
+        hsv = cv2.cvtColor(head_region, cv2.COLOR_BGR2HSV)
+        h, s, v = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+        helmet_mask = (v <= 50) | ((s <= 50) & (v >= 100)) | \
+            ((h >= 100) & (h <= 130) & (s >= 50) & (v >= 50))
+        return int(helmet_mask.sum(dtype=np.uint32))
+    
     @staticmethod
     def detect_helmet(frame, person_bbox):
         """Detect if person is wearing a helmet"""
@@ -13,20 +102,20 @@ class HelmetDetector:
         
         if head_region.size == 0:
             return False
-            
-        hsv = cv2.cvtColor(head_region, cv2.COLOR_BGR2HSV)
-        
-        # Define helmet color ranges
-        helmet_colors = [
-            ((0, 0, 0), (180, 255, 50)),      # Dark colors
-            ((0, 0, 100), (180, 50, 255)),    # Bright colors
-            ((100, 50, 50), (130, 255, 255))  # Blue range
-        ]
         
-        helmet_pixels = 0
-        for lower, upper in helmet_colors:
-            mask = cv2.inRange(hsv, lower, upper)
-            helmet_pixels += cv2.countNonZero(mask)
+        # The color-ratio test is scale-invariant, so large crops are analysed at half resolution
+        if head_region.size > Config.HELMET_DOWNSAMPLE_SIZE:
+            head_region = cv2.resize(head_region, (max(1, head_region.shape[1] // 2), max(1, head_region.shape[0] // 2)),
+                                     interpolation=cv2.INTER_AREA)
+            
+        if HAS_NUMBA:
+            # Compiled per-pixel count on the BGR crop; no HSV copy or temporary boolean planes
+            helmet_pixels = _count_helmet_pixels(head_region)
+        elif HelmetDetector._use_opencl and \
+                head_region.shape[0] * head_region.shape[1] >= Config.HELMET_OPENCL_MIN_PIXELS:
+            helmet_pixels = HelmetDetector._count_opencl(head_region)
+        else:
+            helmet_pixels = HelmetDetector._count_numpy(head_region)
         
         total_pixels = head_region.shape[0] * head_region.shape[1]
         helmet_ratio = helmet_pixels / total_pixels if total_pixels > 0 else 0
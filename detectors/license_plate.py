@@ -1,92 +1,278 @@
 import cv2
 import numpy as np
 import re
+import threading
+from collections import OrderedDict
 from models.detection_models import ModelManager
 from config.settings import Config
+from core.utils import ImageUtils
+from detectors.plate_ocr import PlateRecognizer
+
+# Edge-preserving smoothing backends: CUDA bilateral, then the contrib guided filter, then CPU bilateral
+try:
+    HAS_CUDA_FILTERS = cv2.cuda.getCudaEnabledDeviceCount() > 0
+except (AttributeError, cv2.error):
+    HAS_CUDA_FILTERS = False
+HAS_GUIDED_FILTER = hasattr(cv2, 'ximgproc')
+
+# Common OCR corrections for Indian license plates, applied to every letter
+_OCR_CORRECTIONS = str.maketrans({'O': '0', 'I': '1', 'L': '1', 'S': '5', 'Z': '2', 'G': '6', 'B': '8'})
+_NON_ALNUM_RE = re.compile(r'[^A-Z0-9]')
+
+# Structuring element for closing gaps in thresholded plate text
+_CLOSE_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
+
+# Plate formats validated after cleaning (text is already restricted to A-Z0-9)
+_PLATE_PATTERNS = (
+    r'[A-Z]{2}[0-9]{2}[A-Z]{1,2}[0-9]{3,5}',  # Standard format
+    r'[A-Z]{1,3}[0-9]{1,2}[A-Z]{1,3}[0-9]{3,5}',  # Variations
+    r'[0-9]{2}[A-Z]{2}[0-9]{4}',  # Some old formats
+)
+_PLATE_RE = re.compile(r'^(?:' + '|'.join(_PLATE_PATTERNS) + r')$')
+
+# Hyperscan matches all formats with one compiled automaton when installed; re is the fallback
+try:
+    import hyperscan
+    _PLATE_DB = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+    _PLATE_DB.compile(expressions=[f'^{pattern}$'.encode() for pattern in _PLATE_PATTERNS],
+                      ids=list(range(len(_PLATE_PATTERNS))),
+                      flags=[hyperscan.HS_FLAG_SINGLEMATCH] * len(_PLATE_PATTERNS))
+    _PLATE_DB_LOCK = threading.Lock()  # A database's scratch space serves one scan at a time
+    HAS_HYPERSCAN = True
+except Exception:
+    HAS_HYPERSCAN = False
+_HAS_LETTER = re.compile(r'[A-Z]').search
+_HAS_DIGIT = re.compile(r'[0-9]').search
 
 class LicensePlateDetector:
     def __init__(self):
         self.model_manager = ModelManager()
+        self.plate_recognizer = PlateRecognizer()
+        self._plate_cache = OrderedDict()
+        self._cache_lock = threading.Lock()  # Plates may be read from several threads
+        self._cuda_local = threading.local()  # Per-thread GPU buffers and stream for filtering
+        self._scratch = threading.local()  # Per-thread intermediate images, reused across crops
+        self._ocr_pipelines = {}  # Crop shape -> preprocessing specialised for it
     
-    def detect_license_plate(self, frame, vehicle_bbox):
+    def detect_license_plate(self, frame, vehicle_bbox, track_id=None):
         """Extract license plate text from vehicle with enhanced preprocessing"""
+        # Same cascade as several vehicles; a clearly readable plate stops after the first OCR pass
+        return self.detect_license_plates(frame, [vehicle_bbox], [track_id])[0]
+    
+    def detect_license_plates(self, frame, vehicle_bboxes, track_ids=None):
+        """Read plates for several vehicles, batching each OCR stage across every uncached vehicle"""
+        plates = [""] * len(vehicle_bboxes)
         try:
-            ocr_reader = self.model_manager.get_ocr_reader()
-            x1, y1, x2, y2 = vehicle_bbox
-            
-            # Extract vehicle ROI with some padding
-            padding = 10
-            x1 = max(0, x1 - padding)
-            y1 = max(0, y1 - padding)
-            x2 = min(frame.shape[1], x2 + padding)
-            y2 = min(frame.shape[0], y2 + padding)
-            
-            vehicle_roi = frame[y1:y2, x1:x2]
-            
-            if vehicle_roi.size == 0:
-                return ""
-            
-            # Focus on the lower part of vehicle where license plates are typically located
-            height = vehicle_roi.shape[0]
-            lower_roi = vehicle_roi[int(height*0.6):, :]
+            # The plate-specialised recognizer answers the same batched call as EasyOCR
+            ocr_reader = self.plate_recognizer if self.plate_recognizer.available \
+                else self.model_manager.get_ocr_reader()
+            track_ids = track_ids if track_ids is not None else [None] * len(vehicle_bboxes)
             
-            # Try multiple preprocessing approaches
-            license_candidates = []
+            # Serve cache hits directly; gather the plate search rows of every miss
+            pending = []
+            for index, (vehicle_bbox, track_id) in enumerate(zip(vehicle_bboxes, track_ids)):
+                prepared = self._prepare_plate_inputs(frame, vehicle_bbox, track_id)
+                if prepared is None:
+                    continue
+                cache_key, cached_plate, lower_roi = prepared
+                if cached_plate is not None:
+                    plates[index] = cached_plate
+                else:
+                    pending.append((index, cache_key, lower_roi))
             
-            # Method 1: Original image
-            candidates = self._extract_text_with_ocr(ocr_reader, lower_roi)
-            license_candidates.extend(candidates)
+            if not pending:
+                return plates
             
-            # Method 2: Enhanced preprocessing
-            enhanced_roi = self._preprocess_for_ocr(lower_roi)
-            candidates = self._extract_text_with_ocr(ocr_reader, enhanced_roi)
-            license_candidates.extend(candidates)
-            
-            # Method 3: Contour-based license plate detection
-            plate_regions = self._detect_plate_regions(lower_roi)
-            for region in plate_regions:
-                processed_region = self._preprocess_for_ocr(region)
-                candidates = self._extract_text_with_ocr(ocr_reader, processed_region)
-                license_candidates.extend(candidates)
+            # Cascade from the plain crop to costlier variants, dropping each vehicle once it reads confidently;
+            # every stage is one batched detector/recognizer pass over the vehicles still unread
+            candidates = {index: [] for index, _, _ in pending}
+            grays = {}
+            unread = pending
+            gray_from_start = self.plate_recognizer.available  # It reads grayscale, so even method 1 uses gray
+            stage_exits = (Config.OCR_EARLY_EXIT_CONFIDENCE, Config.OCR_SKIP_REGIONS_CONFIDENCE, None)
+            for stage, exit_confidence in enumerate(stage_exits):
+                batch = []
+                for index, _, lower_roi in unread:
+                    if (stage or gray_from_start) and index not in grays:
+                        grays[index] = cv2.cvtColor(lower_roi, cv2.COLOR_BGR2GRAY)
+                    batch.append((index, self._stage_inputs(stage, lower_roi, grays.get(index))))
+                
+                ocr_inputs = [ocr_input for _, inputs in batch for ocr_input in inputs]
+                if ocr_inputs:
+                    input_candidates = iter(self._extract_text_batched(ocr_reader, ocr_inputs))
+                    for index, inputs in batch:
+                        for _ in inputs:
+                            candidates[index].extend(next(input_candidates))
+                
+                if exit_confidence is not None:
+                    unread = [entry for entry in unread
+                              if max((conf for _, conf in candidates[entry[0]]), default=0) <= exit_confidence]
+                if not unread:
+                    break
             
-            # Return the best candidate
-            return self._select_best_license_plate(license_candidates)
+            for index, cache_key, _ in pending:
+                best_plate = self._select_best_license_plate(candidates[index])
+                self._cache_plate(cache_key, best_plate)
+                plates[index] = best_plate
             
         except Exception as e:
             print(f"License plate detection error: {e}")
-            return ""
+        return plates
     
-    def _preprocess_for_ocr(self, roi):
-        """Enhanced preprocessing for better OCR results"""
-        # Convert to grayscale
-        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY) if len(roi.shape) == 3 else roi
+    def _prepare_plate_inputs(self, frame, vehicle_bbox, track_id=None):
+        """Crop a vehicle and return (cache key, cached plate or None, plate search rows), or None if unreadable"""
+        x1, y1, x2, y2 = vehicle_bbox
+        
+        # Skip distant vehicles whose plate would be too small to read
+        if not self.is_plate_candidate(vehicle_bbox):
+            return None
+        
+        # Extract vehicle ROI with some padding
+        padding = 10
+        x1 = max(0, x1 - padding)
+        y1 = max(0, y1 - padding)
+        x2 = min(frame.shape[1], x2 + padding)
+        y2 = min(frame.shape[0], y2 + padding)
+        
+        vehicle_roi = frame[y1:y2, x1:x2]
+        
+        if vehicle_roi.size == 0:
+            return None
+        
+        # Return the cached result if this crop was already read
+        cache_key = self._cache_key(vehicle_roi, track_id)
+        cached_plate = self._cached_plate(cache_key)
+        if cached_plate is not None:
+            return cache_key, cached_plate, None
         
-        # Apply bilateral filter to reduce noise while preserving edges
-        filtered = cv2.bilateralFilter(gray, 9, 75, 75)
+        # Focus on the lower part of vehicle where license plates are typically located
+        height = vehicle_roi.shape[0]
+        lower_roi = vehicle_roi[int(height*0.6):, :]
         
-        # Apply adaptive thresholding
-        thresh = cv2.adaptiveThreshold(filtered, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                                     cv2.THRESH_BINARY, 11, 2)
+        # Shrink wide crops to the OCR working width; every cascade method then runs on fewer pixels
+        lower_height, lower_width = lower_roi.shape[:2]
+        if lower_width > Config.OCR_INPUT_WIDTH:
+            scaled_height = max(1, round(lower_height * Config.OCR_INPUT_WIDTH / lower_width))
+            lower_roi = cv2.resize(lower_roi, (Config.OCR_INPUT_WIDTH, scaled_height),
+                                   interpolation=cv2.INTER_AREA)
         
-        # Apply morphological operations to clean up
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
-        processed = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
+        return cache_key, None, lower_roi
+    
+    def _stage_inputs(self, stage, lower_roi, lower_gray):
+        """OCR inputs for one cascade stage: the plain rows, their enhanced version, or contour regions"""
+        # Method 1: Original image (its grayscale when that is what the recognizer reads)
+        if stage == 0:
+            return [lower_roi if lower_gray is None else lower_gray]
+        
+        # Method 2: Enhanced preprocessing
+        if stage == 1:
+            return [self._preprocess_for_ocr(lower_gray)]
         
+        # Method 3: Contour-based license plate detection, slicing regions from the one gray image
+        return [self._preprocess_for_ocr(lower_gray[y:y+h, x:x+w])
+                for x, y, w, h in self._detect_plate_regions(lower_gray)]
+    
+    def is_plate_candidate(self, vehicle_bbox):
+        """Check whether a vehicle box is large enough to hold a legible plate"""
+        x1, y1, x2, y2 = vehicle_bbox
+        width, height = x2 - x1, y2 - y1
+        return width >= Config.MIN_PLATE_CANDIDATE_WIDTH and width * height >= Config.MIN_PLATE_CANDIDATE_AREA
+    
+    def _cache_key(self, vehicle_roi, track_id=None):
+        """Build an OCR cache key from the track and a difference hash of the vehicle crop"""
+        # 64-bit dHash: sign of horizontal gradients on a 9x8 thumbnail, stable across
+        # the small shifts and noise between frames of the same vehicle
+        thumbnail = cv2.cvtColor(cv2.resize(vehicle_roi, (9, 8), interpolation=cv2.INTER_AREA),
+                                 cv2.COLOR_BGR2GRAY)
+        dhash = int.from_bytes(np.packbits(thumbnail[:, 1:] > thumbnail[:, :-1]).tobytes(), 'big')
+        engine = "fast_plate_ocr" if self.plate_recognizer.available else "easyocr"
+        return (engine, Config.LICENSE_PLATE_CONFIDENCE_THRESHOLD, track_id), dhash
+    
+    def _cached_plate(self, cache_key):
+        """Return the plate read from a near-identical crop of the same track, or None"""
+        bucket_key, dhash = cache_key
+        with self._cache_lock:
+            entries = self._plate_cache.get(bucket_key)
+            if entries is None:
+                return None
+            self._plate_cache.move_to_end(bucket_key)
+            # Newest first; a few flipped gradient bits are jitter and lighting, not a new plate
+            for cached_hash, plate in reversed(entries):
+                if (cached_hash ^ dhash).bit_count() <= Config.PLATE_HASH_MAX_DISTANCE:
+                    return plate
+        return None
+    
+    def _cache_plate(self, cache_key, plate):
+        """Store an OCR result, evicting the least recently used track when full"""
+        bucket_key, dhash = cache_key
+        with self._cache_lock:
+            entries = self._plate_cache.setdefault(bucket_key, [])
+            entries.append((dhash, plate))
+            # Untracked crops (single images) all share one bucket, so it keeps the full cache size
+            limit = Config.PLATE_HASHES_PER_TRACK if bucket_key[2] is not None else Config.PLATE_CACHE_SIZE
+            if len(entries) > limit:
+                del entries[0]
+            self._plate_cache.move_to_end(bucket_key)
+            if len(self._plate_cache) > Config.PLATE_CACHE_SIZE:
+                self._plate_cache.popitem(last=False)
+    
+    def _preprocess_for_ocr(self, gray):
+        """Enhanced preprocessing of a grayscale crop for better OCR results"""
+        # Crop sizes repeat across frames; reuse the pipeline specialised for this one
+        pipeline = self._ocr_pipelines.get(gray.shape)
+        if pipeline is None:
+            if len(self._ocr_pipelines) >= Config.OCR_PIPELINE_CACHE_SIZE:
+                self._ocr_pipelines.clear()
+            pipeline = self._ocr_pipelines[gray.shape] = self._build_ocr_pipeline(*gray.shape)
+        return pipeline(gray)
+    
+    def _build_ocr_pipeline(self, height, width):
+        """Build the preprocessing steps for one crop size, with its upscale decision made up front"""
         # Resize for better OCR (if image is too small)
-        height, width = processed.shape
+        upscale_size = None
         if height < 50 or width < 150:
             scale_factor = max(2, 150 // width)
-            processed = cv2.resize(processed, (width * scale_factor, height * scale_factor),
-                                 interpolation=cv2.INTER_CUBIC)
+            upscale_size = (width * scale_factor, height * scale_factor)
+        smooth, scratch = self._smooth_preserving_edges, self._scratch
         
-        return processed
+        def pipeline(gray):
+            # Reduce noise while preserving edges
+            filtered = smooth(gray)
+            
+            # Apply adaptive thresholding (an intermediate, so it goes into a reused buffer)
+            thresh = cv2.adaptiveThreshold(filtered, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+                                         cv2.THRESH_BINARY, 11, 2,
+                                         dst=ImageUtils.scratch_buffer(scratch, 'thresh', (height, width)))
+            
+            # Apply morphological operations to clean up; the result is an OCR input and gets its own array
+            processed = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, _CLOSE_KERNEL)
+            if upscale_size is not None:
+                processed = cv2.resize(processed, upscale_size, interpolation=cv2.INTER_CUBIC)
+            return processed
+        return pipeline
     
-    def _detect_plate_regions(self, roi):
-        """Detect potential license plate regions using contours"""
-        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY) if len(roi.shape) == 3 else roi
+    def _smooth_preserving_edges(self, gray):
+        """Edge-preserving denoise on the fastest available backend"""
+        if HAS_CUDA_FILTERS:
+            local = self._cuda_local
+            if not hasattr(local, 'stream'):
+                local.stream, local.src = cv2.cuda_Stream(), cv2.cuda_GpuMat()
+            local.src.upload(gray, local.stream)
+            filtered = cv2.cuda.bilateralFilter(local.src, 9, 75, 75, stream=local.stream)
+            result = filtered.download(local.stream)
+            local.stream.waitForCompletion()
+            return result
         
-        # Apply edge detection
-        edges = cv2.Canny(gray, 50, 200)
+        if HAS_GUIDED_FILTER:
+            # O(N) box-filter based; far cheaper than a 9px bilateral kernel at similar edge retention
+            return cv2.ximgproc.guidedFilter(gray, gray, 4, Config.OCR_GUIDED_FILTER_EPS)
+        
+        return cv2.bilateralFilter(gray, 9, 75, 75)
+    
+    def _detect_plate_regions(self, gray):
+        """Detect potential license plate regions in a grayscale crop as (x, y, w, h) boxes"""
+        # Apply edge detection; the edge map only feeds findContours, so its buffer is reused
+        edges = cv2.Canny(gray, 50, 200, edges=ImageUtils.scratch_buffer(self._scratch, 'edges', gray.shape))
         
         # Find contours
         contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -100,87 +286,81 @@ class LicensePlateDetector:
                 
                 # License plates typically have aspect ratio between 2:1 and 5:1
                 if 1.5 < aspect_ratio < 6.0 and w > 50 and h > 15:
-                    # Extract the region
-                    plate_region = roi[y:y+h, x:x+w]
-                    if plate_region.size > 0:
-                        plate_regions.append(plate_region)
+                    # Keep the box; the caller slices it from the gray image it already holds
+                    plate_regions.append((x, y, w, h))
         
         return plate_regions
     
-    def _extract_text_with_ocr(self, ocr_reader, image):
-        """Extract text using OCR with improved settings"""
+    def _extract_text_batched(self, ocr_reader, images):
+        """Extract text from several images in one batched OCR pass, returning candidates per image"""
         try:
-            results = ocr_reader.readtext(
-                image,
+            # readtext_batched resizes every input to one size; cap it at the single-image working size
+            n_width = min(Config.OCR_INPUT_WIDTH, max(image.shape[1] for image in images))
+            n_height = min(Config.OCR_BATCH_HEIGHT, max(image.shape[0] for image in images))
+            if ocr_reader is not self.plate_recognizer:
+                # Letterbox each crop onto the common size so EasyOCR does not stretch its characters;
+                # the plate recognizer resizes every crop to its own input itself
+                images = [ImageUtils.fit_to_canvas(image, n_width, n_height) for image in images]
+            results = ocr_reader.readtext_batched(
+                images,
+                n_width=n_width,
+                n_height=n_height,
                 allowlist='0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ',
                 width_ths=0.7,
                 height_ths=0.7,
-                paragraph=False
+                paragraph=False,
+                canvas_size=Config.OCR_INPUT_WIDTH,
+                mag_ratio=1.0
             )
-            
-            candidates = []
-            for (bbox, text, conf) in results:
-                if conf > Config.LICENSE_PLATE_CONFIDENCE_THRESHOLD:
-                    clean_text = self._clean_license_text(text)
-                    if self._is_valid_indian_license_plate(clean_text):
-                        candidates.append((clean_text, conf))
-            
-            return candidates
+            return [self._filter_candidates(image_results) for image_results in results]
             
         except Exception as e:
-            print(f"OCR extraction error: {e}")
-            return []
+            print(f"Batched OCR extraction error: {e}")
+            return [[] for _ in images]
+    
+    def _filter_candidates(self, results):
+        """Keep confident OCR readings that look like license plates"""
+        candidates = []
+        for (bbox, text, conf) in results:
+            if conf > Config.LICENSE_PLATE_CONFIDENCE_THRESHOLD:
+                clean_text = self._clean_license_text(text)
+                if self._is_valid_indian_license_plate(clean_text):
+                    candidates.append((clean_text, conf))
+        return candidates
     
     def _clean_license_text(self, text):
         """Clean and format license plate text"""
-        # Remove non-alphanumeric characters
-        clean_text = re.sub(r'[^A-Z0-9]', '', text.upper())
-        
-        # Common OCR corrections for Indian license plates
-        corrections = {
-            'O': '0', 'I': '1', 'L': '1', 'S': '5', 'Z': '2', 'G': '6', 'B': '8'
-        }
-        
-        # Apply corrections only to numeric parts
-        result = ""
-        for char in clean_text:
-            if char.isdigit() or char in corrections.values():
-                result += char
-            elif char.isalpha():
-                result += corrections.get(char, char)
-            else:
-                result += char
-        
-        return result
+        # Remove non-alphanumeric characters, then apply common OCR corrections in one C-level pass
+        return _NON_ALNUM_RE.sub('', text.upper()).translate(_OCR_CORRECTIONS)
     
     def _is_valid_indian_license_plate(self, text):
         """Validate if text matches Indian license plate patterns"""
         if not text or len(text) < 6:
             return False
         
-        # Indian license plate patterns:
+        # Indian license plate patterns (standard, variations, some old formats), one compiled alternation:
         # Old format: XX00XX0000 (2 letters, 2 digits, 2 letters, 4 digits)
         # New format: XX00XX0000 (2 letters, 2 digits, 2 letters, 4 digits)
-        # Simplified check for alphanumeric with reasonable length
-        
-        patterns = [
-            r'^[A-Z]{2}[0-9]{2}[A-Z]{1,2}[0-9]{3,5}$',  # Standard format
-            r'^[A-Z]{1,3}[0-9]{1,2}[A-Z]{1,3}[0-9]{3,5}$',  # Variations
-            r'^[0-9]{2}[A-Z]{2}[0-9]{4}$',  # Some old formats
-        ]
-        
-        for pattern in patterns:
-            if re.match(pattern, text):
-                return True
+        if self._matches_plate_format(text):
+            return True
         
         # Fallback: reasonable length with mix of letters and numbers
         if 6 <= len(text) <= 12:
-            has_letters = any(c.isalpha() for c in text)
-            has_numbers = any(c.isdigit() for c in text)
-            return has_letters and has_numbers
+            return bool(_HAS_LETTER(text)) and bool(_HAS_DIGIT(text))
         
         return False
     
+    @staticmethod
+    def _matches_plate_format(text):
+        """Check text against every plate format in one pass"""
+        if not HAS_HYPERSCAN:
+            return _PLATE_RE.match(text) is not None
+        
+        matched = []
+        with _PLATE_DB_LOCK:
+            _PLATE_DB.scan(text.encode(), match_event_handler=lambda *match: matched.append(True))
+        return bool(matched)
+    
     def _select_best_license_plate(self, candidates):
         """Select the best license plate candidate from all methods"""
         if not candidates:
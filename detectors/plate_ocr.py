@@ -0,0 +1,42 @@
+import threading
+import cv2
+import numpy as np
+from config.settings import Config
+
+# Plate-specialised ONNX recognizer; EasyOCR remains the fallback when it is not installed
+try:
+    from fast_plate_ocr import ONNXPlateRecognizer
+    HAS_FAST_PLATE_OCR = True
+except ImportError:
+    HAS_FAST_PLATE_OCR = False
+
+class PlateRecognizer:
+    """fast-plate-ocr behind the subset of EasyOCR's Reader interface the plate detector uses"""
+    _lock = threading.Lock()  # Guards the one-time model load
+    _recognizer = None  # One ONNX session shared by every detector; its run() is thread-safe
+    
+    def __init__(self):
+        self.available = HAS_FAST_PLATE_OCR and Config.PLATE_OCR_BACKEND == "fast_plate_ocr"
+    
+    def _get_recognizer(self):
+        """Load the ONNX model on first use (CUDA or OpenVINO providers when onnxruntime has them)"""
+        with self._lock:
+            if PlateRecognizer._recognizer is None:
+                print("Loading plate OCR model...")
+                PlateRecognizer._recognizer = ONNXPlateRecognizer(Config.PLATE_OCR_MODEL, device='auto')
+        return PlateRecognizer._recognizer
+    
+    def readtext_batched(self, images, **kwargs):
+        """Recognize one plate per image in one ONNX batch, as EasyOCR-style (bbox, text, conf) lists"""
+        # No detection stage: each input is already a crop, so EasyOCR's layout options do not apply
+        gray_images = [cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+                       for image in images]
+        texts, char_probs = self._get_recognizer().run(gray_images, return_confidence=True)
+        
+        results = []
+        for text, probs in zip(texts, np.asarray(char_probs)):
+            # Unused slots are padded with '_'; the plate's confidence is its mean character confidence
+            slots = [i for i, char in enumerate(text) if char != '_']
+            plate = ''.join(text[i] for i in slots)
+            results.append([(None, plate, float(probs[slots].mean()))] if slots else [])
+        return results
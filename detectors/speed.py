@@ -1,47 +1,84 @@
 import numpy as np
 from config.settings import Config
+from core.utils import HAS_NUMBA, njit
+
+SPEED_HISTORY = 5  # Readings kept per vehicle for smoothing
+
+@njit(cache=True, fastmath=True)
+def _smooth_history(history, filled, current_speed):
+    """Mean of the filled history slots within half the median of each other"""
+    # Insertion sort of at most SPEED_HISTORY values for the median
+    ordered = history[:filled].copy()
+    for i in range(1, filled):
+        value = ordered[i]
+        j = i - 1
+        while j >= 0 and ordered[j] > value:
+            ordered[j + 1] = ordered[j]
+            j -= 1
+        ordered[j + 1] = value
+    median_speed = (ordered[(filled - 1) // 2] + ordered[filled // 2]) / 2
+    
+    # Remove outliers (speeds that are too different from the median)
+    total = 0.0
+    kept = 0
+    for i in range(filled):
+        if abs(history[i] - median_speed) < median_speed * 0.5:
+            total += history[i]
+            kept += 1
+    return total / kept if kept else current_speed
+
+@njit(cache=True)
+def _smooth_rows(history, counts, rows, current_speeds):
+    """Smooth the latest reading of each listed track row against its history"""
+    smoothed = current_speeds.copy()
+    for i in range(rows.size):
+        count = counts[rows[i]]
+        if count > 1:
+            smoothed[i] = _smooth_history(history[rows[i]], min(count, SPEED_HISTORY), current_speeds[i])
+    return smoothed
 
 class SpeedCalculator:
-    def __init__(self):
-        # Initialize tracking dictionaries for enhanced speed calculation
-        self.vehicle_tracks = {}
-        self.frame_timestamps = {}
+    def __init__(self, capacity=64):
+        # Struct-of-arrays track table: one row per vehicle holding its speed ring buffer,
+        # reading count and last timestamp (NaN until one is seen); rows are recycled
+        self._history = np.zeros((capacity, SPEED_HISTORY))
+        self._counts = np.zeros(capacity, dtype=np.int64)
+        self._last_timestamps = np.full(capacity, np.nan)
+        self._rows = {}
+        self._free_rows = list(range(capacity - 1, -1, -1))
+        
+        # Pay the JIT compile (or cache load) once up front rather than on the first moving vehicle
+        if HAS_NUMBA:
+            _smooth_rows(self._history, self._counts, np.zeros(1, dtype=np.int64), np.zeros(1))
     
     def calculate_speed(self, prev_center, curr_center, fps):
         """Calculate vehicle speed (backward compatible method)"""
         if prev_center is None or curr_center is None:
             return 0
         
+        return self.calculate_speeds_batch([prev_center], [curr_center], fps)[0]
+    
+    def calculate_speeds_batch(self, prev_centers, curr_centers, fps):
+        """Calculate speeds for several vehicles at once from (N, 2) arrays of centers"""
         try:
-            # Calculate pixel distance
-            pixel_distance = np.sqrt(
-                (curr_center[0] - prev_center[0])**2 + 
-                (curr_center[1] - prev_center[1])**2
-            )
+            prev_centers = np.asarray(prev_centers, dtype=np.float64).reshape(-1, 2)
+            curr_centers = np.asarray(curr_centers, dtype=np.float64).reshape(-1, 2)
             
-            # Ignore very small movements (likely detection noise)
-            if pixel_distance < 5:
-                return 0
+            # Pixel distance for every vehicle in one pass
+            pixel_distance = self._pixel_distances(prev_centers, curr_centers)
             
-            # Convert to real-world distance
-            real_distance = pixel_distance * Config.PIXEL_TO_METER_RATIO
-            
-            # Calculate time difference
+            # Convert to km/h over one frame interval and apply reasonable limits
             time_diff = 1.0 / fps if fps > 0 else 1.0
+            speeds = np.clip(pixel_distance * (Config.PIXEL_TO_METER_RATIO * 3.6 / time_diff),
+                             0, Config.MAX_SPEED_KMH)
             
-            # Calculate speed in m/s then convert to km/h
-            speed_mps = real_distance / time_diff
-            speed_kmh = speed_mps * 3.6
-            
-            # Apply reasonable limits
-            final_speed = max(0, min(Config.MAX_SPEED_KMH, speed_kmh))
-            
-            # Only return speed if it's above minimum threshold
-            return final_speed if final_speed > getattr(Config, 'MIN_SPEED_THRESHOLD', 5) else 0
+            # Ignore very small movements (likely detection noise) and speeds under the minimum threshold
+            speeds[(pixel_distance < 5) | (speeds <= getattr(Config, 'MIN_SPEED_THRESHOLD', 5))] = 0
+            return speeds.tolist()
             
         except Exception as e:
             print(f"Speed calculation error: {e}")
-            return 0
+            return [0] * len(prev_centers)
     
     # Enhanced method for vehicle tracking (optional, backward compatible)
     def calculate_speed_enhanced(self, vehicle_id, prev_center, curr_center, fps, frame_timestamp=None):
@@ -49,95 +86,121 @@ class SpeedCalculator:
         if prev_center is None or curr_center is None:
             return 0
         
+        return self.calculate_speeds_enhanced_batch(
+            [vehicle_id], [prev_center], [curr_center], fps, frame_timestamp=frame_timestamp)[0]
+    
+    def calculate_speeds_enhanced_batch(self, vehicle_ids, prev_centers, curr_centers, fps, frame_timestamp=None):
+        """Enhanced speed calculation for several tracked vehicles sharing one frame"""
+        if len(vehicle_ids) == 0:
+            return []
+        
         try:
-            # Calculate pixel distance
-            pixel_distance = np.sqrt(
-                (curr_center[0] - prev_center[0])**2 + 
-                (curr_center[1] - prev_center[1])**2
-            )
-            
-            # Ignore very small movements (likely detection noise)
-            if pixel_distance < 5:
-                return 0
-            
-            # Convert to real-world distance
-            real_distance = pixel_distance * Config.PIXEL_TO_METER_RATIO
+            rows = np.array([self._row(vehicle_id) for vehicle_id in vehicle_ids], dtype=np.int64)
             
-            # Calculate time difference
-            if frame_timestamp and vehicle_id in self.frame_timestamps:
-                time_diff = frame_timestamp - self.frame_timestamps[vehicle_id]
-                if time_diff <= 0:
-                    return 0
-            else:
-                time_diff = 1.0 / fps if fps > 0 else 1.0
+            # Calculate pixel distance; ignore very small movements (likely detection noise)
+            pixel_distance = self._pixel_distances(
+                np.asarray(prev_centers, dtype=np.float64).reshape(-1, 2),
+                np.asarray(curr_centers, dtype=np.float64).reshape(-1, 2))
+            valid = pixel_distance >= 5
             
-            # Store current timestamp
+            # Calculate time difference from each track's last timestamp, or the frame interval
+            time_diff = np.full(len(rows), 1.0 / fps if fps > 0 else 1.0)
             if frame_timestamp:
-                self.frame_timestamps[vehicle_id] = frame_timestamp
+                seen = ~np.isnan(self._last_timestamps[rows])
+                time_diff[seen] = frame_timestamp - self._last_timestamps[rows[seen]]
+                valid &= time_diff > 0
+                # Store current timestamp
+                self._last_timestamps[rows[valid]] = frame_timestamp
             
-            # Calculate speed in m/s then convert to km/h
-            speed_mps = real_distance / time_diff
-            speed_kmh = speed_mps * 3.6
+            # Calculate speed in m/s then convert to km/h, for the valid readings only
+            rows, indices = rows[valid], np.flatnonzero(valid)
+            speed_kmh = pixel_distance[valid] * Config.PIXEL_TO_METER_RATIO / time_diff[valid] * 3.6
             
             # Apply smoothing using tracking history
-            smoothed_speed = self._smooth_speed(vehicle_id, speed_kmh)
+            smoothed = self._smooth_speeds(rows, speed_kmh)
             
-            # Clamp to reasonable values
-            final_speed = max(0, min(Config.MAX_SPEED_KMH, smoothed_speed))
+            # Clamp to reasonable values, and only report speeds above minimum threshold
+            final_speeds = np.clip(smoothed, 0, Config.MAX_SPEED_KMH)
+            final_speeds[final_speeds <= getattr(Config, 'MIN_SPEED_THRESHOLD', 5)] = 0
             
-            # Only return speed if it's above minimum threshold
-            return final_speed if final_speed > getattr(Config, 'MIN_SPEED_THRESHOLD', 5) else 0
+            speeds = np.zeros(len(vehicle_ids))
+            speeds[indices] = final_speeds
+            return speeds.tolist()
             
         except Exception as e:
             print(f"Enhanced speed calculation error: {e}")
-            return 0
+            return [0] * len(vehicle_ids)
+    
+    def _row(self, vehicle_id):
+        """Return a vehicle's row in the track table, claiming a free one (growing the table) if new"""
+        row = self._rows.get(vehicle_id)
+        if row is None:
+            if not self._free_rows:
+                capacity = len(self._counts)
+                self._history = np.concatenate([self._history, np.zeros_like(self._history)])
+                self._counts = np.concatenate([self._counts, np.zeros_like(self._counts)])
+                self._last_timestamps = np.concatenate([self._last_timestamps, np.full(capacity, np.nan)])
+                self._free_rows = list(range(2 * capacity - 1, capacity - 1, -1))
+            row = self._rows[vehicle_id] = self._free_rows.pop()
+        return row
+    
+    @staticmethod
+    def _pixel_distances(prev_centers, curr_centers):
+        """Euclidean pixel distance between matching rows of two (N, 2) center arrays"""
+        delta = curr_centers - prev_centers
+        return np.hypot(delta[:, 0], delta[:, 1])
     
-    def _smooth_speed(self, vehicle_id, current_speed):
-        """Apply smoothing to reduce speed calculation noise"""
+    def _smooth_speeds(self, rows, current_speeds):
+        """Apply smoothing to reduce speed calculation noise, for one new reading per track row"""
         try:
-            if vehicle_id not in self.vehicle_tracks:
-                self.vehicle_tracks[vehicle_id] = []
+            # Write each reading into its row's ring buffer (track rows are unique within a frame)
+            self._history[rows, self._counts[rows] % SPEED_HISTORY] = current_speeds
+            self._counts[rows] += 1
             
-            # Add current speed to history
-            self.vehicle_tracks[vehicle_id].append(current_speed)
+            if HAS_NUMBA:
+                # Compiled sort, median and outlier filter per row
+                return _smooth_rows(self._history, self._counts, rows, current_speeds)
             
-            # Keep only last 5 readings for smoothing
-            if len(self.vehicle_tracks[vehicle_id]) > 5:
-                self.vehicle_tracks[vehicle_id] = self.vehicle_tracks[vehicle_id][-5:]
-            
-            # Calculate moving average
-            speeds = self.vehicle_tracks[vehicle_id]
-            
-            if len(speeds) == 1:
-                return current_speed
+            # Vectorized over rows: unfilled slots are NaN, which sorts last and fails every comparison
+            counts = self._counts[rows]
+            filled = np.minimum(counts, SPEED_HISTORY)
+            speeds = np.where(np.arange(SPEED_HISTORY) < filled[:, None], self._history[rows], np.nan)
             
             # Remove outliers (speeds that are too different from the median)
-            median_speed = np.median(speeds)
-            filtered_speeds = [s for s in speeds if abs(s - median_speed) < median_speed * 0.5]
-            
-            if not filtered_speeds:
-                return current_speed
-            
-            return np.mean(filtered_speeds)
+            ordered = np.sort(speeds, axis=1)
+            median_speed = (np.take_along_axis(ordered, ((filled - 1) // 2)[:, None], axis=1)[:, 0] +
+                            np.take_along_axis(ordered, (filled // 2)[:, None], axis=1)[:, 0]) / 2
+            kept = np.abs(speeds - median_speed[:, None]) < median_speed[:, None] * 0.5
+            kept_count = kept.sum(axis=1)
+            means = np.where(kept, speeds, 0).sum(axis=1) / np.maximum(kept_count, 1)
+            
+            # A first reading, or one with nothing near the median, is returned as is
+            return np.where((counts > 1) & (kept_count > 0), means, current_speeds)
         except Exception as e:
             print(f"Error in speed smoothing: {e}")
-            return current_speed
+            return current_speeds
     
     def reset_vehicle_tracking(self, vehicle_id):
         """Reset tracking for a specific vehicle"""
         try:
-            if vehicle_id in self.vehicle_tracks:
-                del self.vehicle_tracks[vehicle_id]
-            if vehicle_id in self.frame_timestamps:
-                del self.frame_timestamps[vehicle_id]
+            row = self._rows.pop(vehicle_id, None)
+            if row is not None:
+                self._counts[row] = 0
+                self._last_timestamps[row] = np.nan
+                self._free_rows.append(row)
         except Exception as e:
             print(f"Error resetting vehicle tracking: {e}")
     
+    def reset(self):
+        """Forget every vehicle track"""
+        for vehicle_id in list(self._rows):
+            self.reset_vehicle_tracking(vehicle_id)
+    
     def clear_old_tracks(self, current_vehicle_ids):
         """Clear tracking data for vehicles no longer in scene"""
         try:
             # Remove tracks for vehicles not seen in current frame
-            old_ids = set(self.vehicle_tracks.keys()) - set(current_vehicle_ids)
+            old_ids = self._rows.keys() - set(current_vehicle_ids)
             for old_id in old_ids:
                 self.reset_vehicle_tracking(old_id)
         except Exception as e:
@@ -1,7 +1,21 @@
 import cv2
 import numpy as np
 
+# Hue (OpenCV 0-179) to color label: 0 none, 1 red, 2 yellow, 3 green; the ranges are disjoint
+_HUE_LABELS = np.zeros(256, dtype=np.uint8)
+_HUE_LABELS[0:11] = 1
+_HUE_LABELS[170:181] = 1
+_HUE_LABELS[20:31] = 2
+_HUE_LABELS[40:81] = 3
+
 class TrafficLightDetector:
+    @staticmethod
+    def _color_labels(hsv):
+        """Label every pixel red, yellow, green or none in one pass over the HSV planes"""
+        h, s, v = cv2.split(hsv)
+        # Saturation and value share the same >= 50 floor for all three colors
+        return _HUE_LABELS[h] * ((s >= 50) & (v >= 50))
+    
     @staticmethod
     def detect_color(frame, bbox):
         """Detect traffic light color from bounding box"""
@@ -14,21 +28,48 @@ class TrafficLightDetector:
             return "unknown"
         
         hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
+        cls = TrafficLightDetector
         
-        # Define color ranges
-        red_mask1 = cv2.inRange(hsv, (0, 50, 50), (10, 255, 255))
-        red_mask2 = cv2.inRange(hsv, (170, 50, 50), (180, 255, 255))
-        red_mask = red_mask1 + red_mask2
+        # One labelling pass, then one tally gives all three counts
+        _, red_pixels, yellow_pixels, green_pixels = np.bincount(
+            cls._color_labels(hsv).ravel(), minlength=4).tolist()
+        
+        return cls._dominant_color(red_pixels, yellow_pixels, green_pixels)
+    
+    @staticmethod
+    def detect_colors(frame, bboxes):
+        """Detect the color of several traffic lights with one HSV conversion and labelling pass"""
+        rois = []
+        for x1, y1, x2, y2 in bboxes:
+            roi = frame[y1:y2, x1:x2] if x2 > x1 and y2 > y1 else frame[0:0, 0:0]
+            rois.append(roi)
         
-        yellow_mask = cv2.inRange(hsv, (20, 50, 50), (30, 255, 255))
-        green_mask = cv2.inRange(hsv, (40, 50, 50), (80, 255, 255))
+        valid = [roi for roi in rois if roi.size > 0]
+        if not valid:
+            return ["unknown"] * len(rois)
         
-        # Count pixels
-        red_pixels = cv2.countNonZero(red_mask)
-        yellow_pixels = cv2.countNonZero(yellow_mask)
-        green_pixels = cv2.countNonZero(green_mask)
+        # Stack the crops vertically into one tile; black padding is never labelled a color
+        heights = [roi.shape[0] for roi in valid]
+        tile = np.zeros((sum(heights), max(roi.shape[1] for roi in valid), 3), dtype=np.uint8)
+        row = 0
+        for roi in valid:
+            tile[row:row + roi.shape[0], :roi.shape[1]] = roi
+            row += roi.shape[0]
         
-        # Determine dominant color
+        hsv = cv2.cvtColor(tile, cv2.COLOR_BGR2HSV)
+        cls = TrafficLightDetector
+        
+        # Tally (crop, label) pairs in a single bincount; each crop owns a block of rows
+        crop_of_row = np.repeat(np.arange(len(valid), dtype=np.intp), heights)
+        bins = crop_of_row[:, None] * 4 + cls._color_labels(hsv)
+        counts = np.bincount(bins.ravel(), minlength=4 * len(valid)).reshape(len(valid), 4).tolist()
+        
+        valid_states = iter(cls._dominant_color(r, y, g) for _, r, y, g in counts)
+        return [next(valid_states) if roi.size > 0 else "unknown" for roi in rois]
+    
+    @staticmethod
+    def _dominant_color(red_pixels, yellow_pixels, green_pixels):
+        """Determine dominant color from per-color pixel counts"""
         if red_pixels > max(yellow_pixels, green_pixels):
             return "red"
         elif yellow_pixels > green_pixels:
@@ -1,37 +1,54 @@
 import cv2
 import numpy as np
+import threading
 from config.settings import Config
+from core.utils import ImageUtils
+
+# Run the line-finding filters on the GPU when OpenCV was built with CUDA and a device is present
+try:
+    HAS_CUDA_FILTERS = cv2.cuda.getCudaEnabledDeviceCount() > 0
+except (AttributeError, cv2.error):
+    HAS_CUDA_FILTERS = False
+
+# Structuring element joining the stripes of a zebra crossing into one blob
+_STRIPE_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 3))
+
+# Per-thread intermediate images, reused across frames of the same size
+_scratch = threading.local()
+
+# Per-thread GPU stream, frame buffer and filters; CUDA filter objects are not safe to share
+_cuda_local = threading.local()
 
 class ViolationLineDetector:
     @staticmethod
-    def detect_zebra_crossing(frame):
-        """Automatically detect zebra crossing and suggest violation line"""
+    def detect_zebra_crossing(frame, scale=1):
+        """Automatically detect zebra crossing and suggest violation line, for a 1/scale downsampled frame"""
         try:
-            # Convert to grayscale
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            height, width = gray.shape
-            
-            # Focus on lower half of the image where crossings are typically located
-            roi = gray[height//2:, :]
-            
-            # Apply Gaussian blur to reduce noise
-            blurred = cv2.GaussianBlur(roi, (5, 5), 0)
+            height, width = frame.shape[:2]
             
-            # Threshold to find white areas (zebra stripes)
-            _, thresh = cv2.threshold(blurred, Config.ZEBRA_CROSSING_WHITE_THRESHOLD, 255, cv2.THRESH_BINARY)
-            
-            # Apply morphological operations to clean up
-            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 3))
-            morph = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
+            if HAS_CUDA_FILTERS:
+                # Upload once; grayscale, blur, threshold and close all stay on the device
+                gpu = ViolationLineDetector._cuda_state()
+                gpu.frame.upload(frame, gpu.stream)
+                gray = cv2.cuda.cvtColor(gpu.frame, cv2.COLOR_BGR2GRAY, stream=gpu.stream)
+                morph = ViolationLineDetector._stripe_mask_cuda(gpu, gray.rowRange(height//2, height))
+            else:
+                # Convert to grayscale
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY,
+                                    dst=ImageUtils.scratch_buffer(_scratch, 'gray', (height, width)))
+                
+                # Focus on lower half of the image where crossings are typically located
+                morph = ViolationLineDetector._stripe_mask(gray[height//2:, :])
             
             # Find contours
             contours, _ = cv2.findContours(morph, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
             
-            # Filter contours by area and aspect ratio
+            # Filter contours by area (in full-resolution pixels) and aspect ratio
+            min_area = Config.ZEBRA_CROSSING_MIN_AREA / (scale * scale)
             zebra_candidates = []
             for contour in contours:
                 area = cv2.contourArea(contour)
-                if area > Config.ZEBRA_CROSSING_MIN_AREA:
+                if area > min_area:
                     x, y, w, h = cv2.boundingRect(contour)
                     aspect_ratio = w / h if h > 0 else 0
                     
@@ -53,12 +70,51 @@ class ViolationLineDetector:
                 return [line_start, line_end]
             
             # Fallback: Use Hough line detection for road markings
+            if HAS_CUDA_FILTERS:
+                return ViolationLineDetector._detect_road_markings_cuda(gpu, gray, height, width)
             return ViolationLineDetector._detect_road_markings(gray)
             
         except Exception as e:
             print(f"Error in zebra crossing detection: {e}")
             return None
     
+    @staticmethod
+    def _stripe_mask(roi):
+        """Blur, threshold and close a grayscale region into a mask of white stripe blobs"""
+        # Apply Gaussian blur to reduce noise
+        blurred = cv2.GaussianBlur(roi, (5, 5), 0,
+                                   dst=ImageUtils.scratch_buffer(_scratch, 'blurred', roi.shape))
+        
+        # Threshold to find white areas (zebra stripes), in place over the blurred copy
+        _, thresh = cv2.threshold(blurred, Config.ZEBRA_CROSSING_WHITE_THRESHOLD, 255, cv2.THRESH_BINARY,
+                                  dst=blurred)
+        
+        # Apply morphological operations to clean up
+        return cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, _STRIPE_KERNEL,
+                                dst=ImageUtils.scratch_buffer(_scratch, 'morph', roi.shape))
+    
+    @staticmethod
+    def _cuda_state():
+        """Build this thread's GPU stream, upload buffer and line-finding filters on first use"""
+        gpu = _cuda_local
+        if not hasattr(gpu, 'stream'):
+            gpu.stream, gpu.frame = cv2.cuda_Stream(), cv2.cuda_GpuMat()
+            gpu.gauss = cv2.cuda.createGaussianFilter(cv2.CV_8UC1, cv2.CV_8UC1, (5, 5), 0)
+            gpu.close = cv2.cuda.createMorphologyFilter(cv2.MORPH_CLOSE, cv2.CV_8UC1, _STRIPE_KERNEL)
+            gpu.canny = cv2.cuda.createCannyEdgeDetector(50, 150, 3)
+            gpu.segments = (None, None)
+        return gpu
+    
+    @staticmethod
+    def _stripe_mask_cuda(gpu, roi):
+        """GPU version of _stripe_mask, downloading only the finished mask for contour search"""
+        blurred = gpu.gauss.apply(roi, stream=gpu.stream)
+        _, thresh = cv2.cuda.threshold(blurred, Config.ZEBRA_CROSSING_WHITE_THRESHOLD, 255, cv2.THRESH_BINARY,
+                                       stream=gpu.stream)
+        mask = gpu.close.apply(thresh, stream=gpu.stream).download(gpu.stream)
+        gpu.stream.waitForCompletion()
+        return mask
+    
     @staticmethod
     def _detect_road_markings(gray):
         """Fallback method using Hough line detection"""
@@ -66,38 +122,64 @@ class ViolationLineDetector:
             height, width = gray.shape
             
             # Apply edge detection
-            edges = cv2.Canny(gray, 50, 150, apertureSize=3)
+            edges = cv2.Canny(gray, 50, 150, edges=ImageUtils.scratch_buffer(_scratch, 'edges', gray.shape),
+                              apertureSize=3)
             
             # Focus on horizontal lines in the lower half
             roi_edges = edges[height//2:, :]
             
-            # Detect lines using Hough transform
-            lines = cv2.HoughLines(roi_edges, 1, np.pi/180, threshold=100)
+            # Detect line segments using the probabilistic Hough transform
+            segments = cv2.HoughLinesP(roi_edges, 1, np.pi/180, 100, minLineLength=width//4, maxLineGap=20)
             
-            if lines is not None:
-                horizontal_lines = []
-                for rho, theta in lines[:10]:  # Check first 10 lines
-                    # Filter for nearly horizontal lines
-                    if abs(theta - np.pi/2) < 0.3:  # Within ~17 degrees of horizontal
-                        y = int(rho / np.sin(theta)) + height//2
-                        if height//2 < y < height - 50:  # In lower half but not at bottom
-                            horizontal_lines.append(y)
-                
-                if horizontal_lines:
-                    # Use the topmost horizontal line in the lower half
-                    line_y = min(horizontal_lines)
-                    return [(50, line_y), (width - 50, line_y)]
+            return ViolationLineDetector._line_from_segments(segments, height, width)
             
-            # Ultimate fallback: horizontal line at 3/4 height
+        except Exception as e:
+            print(f"Error in road marking detection: {e}")
+            height, width = gray.shape
             fallback_y = int(height * 0.75)
             return [(50, fallback_y), (width - 50, fallback_y)]
+    
+    @staticmethod
+    def _detect_road_markings_cuda(gpu, gray, height, width):
+        """GPU version of _detect_road_markings on the device grayscale frame"""
+        try:
+            # The minimum segment length follows the frame width, so the detector is rebuilt when it changes
+            segment_width, detector = gpu.segments
+            if segment_width != width:
+                detector = cv2.cuda.createHoughSegmentDetector(1, np.pi/180, width//4, 20)
+                gpu.segments = (width, detector)
+            
+            # Edges over the whole frame, as on the CPU, then segments on the lower half only
+            edges = gpu.canny.detect(gray, stream=gpu.stream)
+            segments = detector.detect(edges.rowRange(height//2, height), stream=gpu.stream).download(gpu.stream)
+            gpu.stream.waitForCompletion()
+            
+            return ViolationLineDetector._line_from_segments(segments, height, width)
             
         except Exception as e:
             print(f"Error in road marking detection: {e}")
-            height, width = gray.shape
             fallback_y = int(height * 0.75)
             return [(50, fallback_y), (width - 50, fallback_y)]
     
+    @staticmethod
+    def _line_from_segments(segments, height, width):
+        """Pick the topmost near-horizontal segment in the lower half, or the 3/4 height fallback"""
+        if segments is not None and segments.size:
+            # (x1, y1, x2, y2) rows from either backend; keep segments within ~17 degrees of horizontal
+            x1, y1, x2, y2 = segments.reshape(-1, 4).T.astype(np.int64)
+            horizontal = np.abs(y2 - y1) < np.tan(0.3) * np.abs(x2 - x1)
+            ys = (y1[horizontal] + y2[horizontal]) // 2 + height//2
+            
+            # In lower half but not at bottom; use the topmost remaining line
+            ys = ys[(ys > height//2) & (ys < height - 50)]
+            if ys.size:
+                line_y = int(ys.min())
+                return [(50, line_y), (width - 50, line_y)]
+        
+        # Ultimate fallback: horizontal line at 3/4 height
+        fallback_y = int(height * 0.75)
+        return [(50, fallback_y), (width - 50, fallback_y)]
+    
     @staticmethod
     def visualize_detection(frame, detected_line):
         """Draw detected violation line for visualization"""
@@ -1,34 +1,168 @@
+import os
+import threading
+import numpy as np
+import torch
 from ultralytics import YOLO
 import easyocr
 from config.settings import Config
 
 class ModelManager:
     _instance = None
+    _lock = threading.RLock()  # Guards creation and loading so models load once across threads
     
     def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance._initialized = False
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance._initialized = False
         return cls._instance
     
     def __init__(self):
-        if not self._initialized:
-            self.yolo_model = None
-            self.ocr_reader = None
-            self._initialized = True
+        # A racing constructor must not reset models another thread has just loaded
+        with self._lock:
+            if not self._initialized:
+                self.yolo_model = None
+                self.ocr_reader = None
+                self.vehicle_class_ids = frozenset()
+                self.person_class_id = None
+                self.traffic_light_class_id = None
+                self._initialized = True
     
     def load_models(self):
         """Load YOLO and OCR models"""
-        if self.yolo_model is None:
-            print("Loading YOLO model...")
-            self.yolo_model = YOLO(Config.YOLO_MODEL_PATH)
-        
-        if self.ocr_reader is None:
-            print("Loading OCR model...")
-            self.ocr_reader = easyocr.Reader(Config.OCR_LANGUAGES)
+        with self._lock:
+            if self.yolo_model is None:
+                print("Loading YOLO model...")
+                yolo_model = self._load_yolo_model()
+                self._build_class_ids(yolo_model.names)
+                self.yolo_model = yolo_model
+            
+            if self.ocr_reader is None:
+                print("Loading OCR model...")
+                self.ocr_reader = self._load_ocr_reader()
         
         return self.yolo_model, self.ocr_reader
     
+    def _build_class_ids(self, names):
+        """Precompute integer class ids so detections skip the per-box name lookup"""
+        self.vehicle_class_ids = frozenset(
+            cls_id for cls_id, name in names.items() if name in Config.VEHICLE_CLASSES)
+        self.person_class_id = next((cls_id for cls_id, name in names.items() if name == "person"), None)
+        self.traffic_light_class_id = next(
+            (cls_id for cls_id, name in names.items() if name == "traffic light"), None)
+        self._vehicle_id_array = np.array(sorted(self.vehicle_class_ids), dtype=np.int32)
+    
+    def parse_detections(self, results, letterbox=None):
+        """Split YOLO results into vehicles, persons and traffic lights with one host transfer"""
+        return self._split_detections(results.boxes.data.cpu().numpy(), letterbox)
+    
+    def parse_detections_batch(self, results_list, letterboxes=None):
+        """Parse a list of YOLO results, transferring all their boxes to the host at once"""
+        if not results_list:
+            return []
+        
+        box_data = [results.boxes.data for results in results_list]
+        data = torch.cat(box_data).cpu().numpy()
+        split_points = np.cumsum([len(frame_data) for frame_data in box_data])[:-1]
+        letterboxes = letterboxes or [None] * len(results_list)
+        return [self._split_detections(frame_data, letterbox)
+                for frame_data, letterbox in zip(np.split(data, split_points), letterboxes)]
+    
+    def _split_detections(self, data, letterbox=None):
+        """Filter a host (N, 6|7) box array into vehicle, person and traffic light detections"""
+        if len(data) == 0:
+            return [], [], []
+        
+        # Columns are [x1, y1, x2, y2, (track id,) conf, cls]
+        boxes = data[:, :4]
+        if letterbox is not None:
+            # Map boxes from the letterboxed input back to original frame pixels
+            ratio, pad_x, pad_y, width, height = letterbox
+            boxes = (boxes - (pad_x, pad_y, pad_x, pad_y)) / ratio
+            boxes = np.clip(boxes, 0, (width, height, width, height))
+        boxes = boxes.astype(np.int32)
+        confs = data[:, -2]
+        cls_ids = data[:, -1].astype(np.int32)
+        
+        vehicle_mask = np.isin(cls_ids, self._vehicle_id_array) & (confs > Config.VEHICLE_CONFIDENCE_THRESHOLD)
+        person_mask = (cls_ids == self._class_id_or_missing(self.person_class_id)) & \
+            (confs > Config.PERSON_CONFIDENCE_THRESHOLD)
+        light_mask = (cls_ids == self._class_id_or_missing(self.traffic_light_class_id)) & \
+            (confs > Config.TRAFFIC_LIGHT_CONFIDENCE_THRESHOLD)
+        
+        names = self.yolo_model.names
+        vehicle_detections = [
+            (names[cls_id], tuple(bbox), conf)
+            for cls_id, bbox, conf in zip(cls_ids[vehicle_mask].tolist(),
+                                          boxes[vehicle_mask].tolist(),
+                                          confs[vehicle_mask].tolist())
+        ]
+        person_detections = [tuple(bbox) for bbox in boxes[person_mask].tolist()]
+        traffic_lights = [tuple(bbox) for bbox in boxes[light_mask].tolist()]
+        
+        return vehicle_detections, person_detections, traffic_lights
+    
+    @staticmethod
+    def _class_id_or_missing(cls_id):
+        """Map an absent class id to a value no detection carries"""
+        return -1 if cls_id is None else cls_id
+    
+    def _load_yolo_model(self):
+        """Load YOLO, preferring a cached TensorRT engine on CUDA devices and OpenVINO on CPU"""
+        if Config.USE_TENSORRT and torch.cuda.is_available():
+            # Name the engine after its build settings so a config change triggers a rebuild
+            precision = "int8" if Config.TENSORRT_INT8 else ("fp16" if Config.TENSORRT_HALF else "fp32")
+            engine_path = (f"{os.path.splitext(Config.YOLO_MODEL_PATH)[0]}"
+                           f"_{precision}_b{Config.YOLO_BATCH_SIZE}_{Config.TENSORRT_IMGSZ}.engine")
+            try:
+                if not os.path.exists(engine_path):
+                    print(f"Exporting YOLO model to {precision.upper()} TensorRT engine (one-time)...")
+                    export_args = dict(
+                        format='engine',
+                        half=Config.TENSORRT_HALF and not Config.TENSORRT_INT8,
+                        imgsz=Config.TENSORRT_IMGSZ,
+                        workspace=Config.TENSORRT_WORKSPACE_GB,
+                        dynamic=True,
+                        batch=Config.YOLO_BATCH_SIZE
+                    )
+                    if Config.TENSORRT_INT8:
+                        export_args.update(int8=True, data=Config.TENSORRT_INT8_DATA)
+                    exported_path = YOLO(Config.YOLO_MODEL_PATH).export(**export_args)
+                    os.replace(exported_path, engine_path)
+                return YOLO(engine_path, task='detect')
+            except Exception as e:
+                print(f"TensorRT export failed, using PyTorch weights: {e}")
+        
+        elif Config.USE_OPENVINO and not torch.cuda.is_available():
+            # CPU hosts: OpenVINO's compiled graph (INT8 on VNNI cores when calibrated) beats eager PyTorch
+            precision = "int8" if Config.OPENVINO_INT8 else "fp32"
+            model_dir = (f"{os.path.splitext(Config.YOLO_MODEL_PATH)[0]}"
+                         f"_{precision}_{Config.YOLO_INPUT_SIZE}_openvino_model")
+            try:
+                if not os.path.isdir(model_dir):
+                    print(f"Exporting YOLO model to {precision.upper()} OpenVINO (one-time)...")
+                    export_args = dict(format='openvino', imgsz=Config.YOLO_INPUT_SIZE, dynamic=True)
+                    if Config.OPENVINO_INT8:
+                        export_args.update(int8=True, data=Config.TENSORRT_INT8_DATA)
+                    exported_dir = YOLO(Config.YOLO_MODEL_PATH).export(**export_args)
+                    os.replace(exported_dir, model_dir)
+                return YOLO(model_dir, task='detect')
+            except Exception as e:
+                print(f"OpenVINO export failed, using PyTorch weights: {e}")
+        
+        return YOLO(Config.YOLO_MODEL_PATH)
+    
+    def _load_ocr_reader(self):
+        """Load EasyOCR on the GPU when available (int8-quantized on CPU) and pay its first-call cost now"""
+        reader = easyocr.Reader(Config.OCR_LANGUAGES, gpu=torch.cuda.is_available(), quantize=True)
+        
+        # The first readtext initialises the detector and recognizer kernels; do it before any request
+        try:
+            reader.readtext(np.zeros((64, 256, 3), dtype=np.uint8))
+        except Exception as e:
+            print(f"OCR warm-up failed: {e}")
+        return reader
+    
     def get_yolo_model(self):
         if self.yolo_model is None:
             self.load_models()
@@ -38,3 +172,22 @@ class ModelManager:
         if self.ocr_reader is None:
             self.load_models()
         return self.ocr_reader
+
+
+class BatchedDetector:
+    """Run YOLO on frame batches, split into chunks the model (and TensorRT engine) accepts"""
+    
+    def __init__(self, max_batch_size=None, model_manager=None):
+        self.model_manager = model_manager or ModelManager()
+        self.max_batch_size = max_batch_size or Config.YOLO_BATCH_SIZE
+    
+    def infer_batch(self, frames):
+        """Run YOLO on a list of frames, returning one result per frame"""
+        if not frames:
+            return []
+        
+        yolo_model = self.model_manager.get_yolo_model()
+        results = []
+        for start in range(0, len(frames), self.max_batch_size):
+            results.extend(yolo_model(frames[start:start + self.max_batch_size], imgsz=Config.YOLO_INPUT_SIZE))
+        return results
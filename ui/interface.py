@@ -1,148 +1,367 @@
+import asyncio
+import cv2
 import gradio as gr
+import logging
 import pandas as pd
 import os
+import threading
+from collections import Counter, OrderedDict
+from config.settings import Config
 from data.dashboard import ViolationDashboard
 
+log = logging.getLogger("traffic_ui")
+
+# Returned for every empty table; Gradio only reads it, so one instance serves all handlers
+_EMPTY_DF = pd.DataFrame()
+
+# Summary Markdown layout, filled from the logger's summary dict
+_SUMMARY_TEMPLATE = """
+📊 **Violation Log Summary:**
+- Total Violations: {total_violations}
+- Repeat Offenders: {repeat_offenders}
+- Latest Violation: {latest_violation}
+**Violation Types:**
+{type_lines}"""
+
 class TrafficViolationInterface:
     def __init__(self, image_processor, video_processor):
         self.image_processor = image_processor
         self.video_processor = video_processor
         self.dashboard = ViolationDashboard()
+        
+        # Running violation type counts of the charted log: (log, entries counted, counts)
+        self._dashboard_counts = (None, 0, Counter())
+        
+        # Rendered charts keyed by their violation type counts, least recently used first
+        self._dashboard_cache = OrderedDict()
+        self._dashboard_lock = threading.Lock()  # Handlers render from worker threads
+        
+        # Near-simultaneous image requests are queued and processed together; both are created on the
+        # event loop the first time a request arrives
+        self._image_queue = None
+        self._image_worker = None
+        
+        # Parsed coordinates per line textbox value; the image and video tabs each have a textbox
+        self._line_cache = {}
+        
+        # Summary Markdown for the CSV log as of its last (mtime, size)
+        self._summary_cache = (None, None)
+        
+        # Last video run: (input and settings key, (output path, output mtime, violation frames))
+        self._video_result = (None, None)
     
-    def process_image(self, image_file, line_coordinates, enable_plate_detection):
+    async def process_image(self, image_file, line_coordinates, enable_plate_detection):
         """Process uploaded image with enhanced features"""
         if image_file is None:
-            return None, pd.DataFrame(), None, None, "Please upload an image first."
+            return None, _EMPTY_DF, None, None, "Please upload an image first."
         
         try:
-            # Parse and set violation line (manual override)
-            line_coords = self.image_processor.detector.parse_line_coordinates(line_coordinates)
+            # Decode in a worker thread so the event loop keeps serving; the batch reuses this frame
+            frame = await asyncio.to_thread(cv2.imread, image_file)
+            if frame is None:
+                return None, _EMPTY_DF, None, None, "❌ Error reading image file."
+            
+            # Parse the manual line only; the batch sets it (or auto-detects one) for this image alone
+            line_coords = self._parse_line(self.image_processor.detector, line_coordinates)
+            
+            # Process image, batched with other requests arriving at the same time
+            output_path, violations_df, auto_line = await self._process_image_batched(
+                frame, line_coords, enable_plate_detection)
             if line_coords:
-                self.image_processor.detector.set_violation_line(line_coords[0], line_coords[1])
                 status_msg = f"✅ Using manual violation line: {line_coords}"
+            elif auto_line:
+                status_msg = f"🤖 Auto-detected violation line: {auto_line}"
             else:
-                # Try auto-detection
-                import cv2
-                frame = cv2.imread(image_file)
-                if frame is not None:
-                    auto_line = self.image_processor.detector.auto_detect_violation_line(frame)
-                    if auto_line:
-                        status_msg = f"🤖 Auto-detected violation line: {auto_line}"
-                    else:
-                        status_msg = "⚠️ No violation line detected. Red light detection disabled."
-                else:
-                    status_msg = "❌ Error reading image file."
+                status_msg = "⚠️ No violation line detected. Red light detection disabled."
             
-            # Process image
-            output_path, violations_df, _ = self.image_processor.process_image(
-                image_file, enable_plate_detection
-            )
+            dashboard_image, csv_path, status_msg = await self._report(
+                self.image_processor.detector.logger, status_msg)
             
-            # Create dashboard and save CSV
-            dashboard_path = None
-            csv_path = None
-            if not violations_df.empty:
-                try:
-                    dashboard_path = self.dashboard.create_dashboard(
-                        self.image_processor.detector.logger.violations_log
-                    )
-                    csv_path = self.image_processor.detector.logger.save_violations_to_csv()
-                    status_msg += f" | 🚨 Found {len(violations_df)} violations."
-                except Exception as e:
-                    print(f"Error creating dashboard: {e}")
-                    status_msg += f" | Found {len(violations_df)} violations (dashboard error)."
-            else:
-                status_msg += " | ✅ No violations detected."
-            
-            return output_path, violations_df, dashboard_path, csv_path, status_msg
+            return output_path, self._table_view(violations_df), dashboard_image, csv_path, status_msg
             
         except Exception as e:
             error_msg = f"❌ Error processing image: {str(e)}"
-            print(f"Image processing error: {e}")
-            return None, pd.DataFrame(), None, None, error_msg
+            log.exception("Image processing error")
+            return None, _EMPTY_DF, None, None, error_msg
+    
+    def warm_up(self):
+        """Run YOLO and the dashboard once on synthetic input so the first request skips cold-start costs"""
+        try:
+            self.image_processor.warm_up()
+            
+            # Builds matplotlib's font cache and the Agg text path; the result is not cached
+            self.dashboard.create_dashboard([{'violation_type': 'red_light'}, {'violation_type': 'no_helmet'}])
+        except Exception:
+            log.exception("Warm-up error")
+    
+    def _parse_line(self, detector, line_coordinates):
+        """Parse the line textbox, reusing the last parse of the same text"""
+        # Handlers run on the event loop thread, so the cache needs no lock
+        if line_coordinates in self._line_cache:
+            return self._line_cache[line_coordinates]
+        line_coords = detector.parse_line_coordinates(line_coordinates)
+        if len(self._line_cache) >= Config.LINE_PARSE_CACHE_SIZE:
+            self._line_cache.clear()
+        self._line_cache[line_coordinates] = line_coords
+        return line_coords
+    
+    def _apply_line(self, detector, line_coordinates):
+        """Set the textbox's line on detector, or clear it so this run auto-detects its own"""
+        line_coords = self._parse_line(detector, line_coordinates)
+        if not line_coords:
+            detector.clear_violation_line()
+        elif detector.violation_line != (line_coords[0], line_coords[1]):
+            detector.set_violation_line(line_coords[0], line_coords[1])
+        return line_coords
+    
+    async def _process_image_batched(self, frame, line_coords, enable_plate_detection):
+        """Queue a decoded image for the batching worker and wait for its result"""
+        if self._image_queue is None:
+            self._image_queue = asyncio.Queue()
+            self._image_worker = asyncio.create_task(self._run_image_batches())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._image_queue.put((frame, line_coords, enable_plate_detection, future))
+        return await future
+    
+    async def _run_image_batches(self):
+        """Collect queued images and flush on batch size or timeout"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._image_queue.get()]
+            deadline = loop.time() + Config.IMAGE_BATCH_TIMEOUT
+            
+            while len(batch) < Config.IMAGE_BATCH_SIZE:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._image_queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            
+            frames, lines, plate_flags, futures = zip(*batch)
+            try:
+                results = await asyncio.to_thread(
+                    self.image_processor.process_image_batch, list(frames), list(lines), list(plate_flags))
+                for future, result in zip(futures, results):
+                    if not future.done():
+                        future.set_result(result)
+            except Exception as e:
+                log.exception("Batched image processing error")
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
     
-    def process_video(self, video_file, line_coordinates, enable_plate_detection):
-        """Process uploaded video with enhanced features"""
+    async def process_video(self, video_file, line_coordinates, enable_plate_detection, batch_size=None,
+                            progress=gr.Progress()):
+        """Process uploaded video with enhanced features, streaming preview segments as they are encoded"""
         if video_file is None:
-            return None, pd.DataFrame(), None, None, "Please upload a video first."
+            yield None, _EMPTY_DF, None, None, "Please upload a video first."
+            return
         
+        stop = threading.Event()
+        driver = None
         try:
             # Parse and set violation line (manual override)
-            line_coords = self.video_processor.detector.parse_line_coordinates(line_coordinates)
+            line_coords = self._apply_line(self.video_processor.detector, line_coordinates)
             if line_coords:
-                self.video_processor.detector.set_violation_line(line_coords[0], line_coords[1])
                 status_msg = f"✅ Using manual violation line: {line_coords}"
             else:
                 status_msg = "🤖 Using auto-detected violation line (if found)."
             
-            # Process video
-            output_path, violations_df, violation_frames = self.video_processor.process_video(
-                video_file, enable_plate_detection
-            )
+            # An identical re-submission reuses the last run while its output file is untouched
+            key = self._video_key(video_file, line_coordinates, enable_plate_detection)
+            cached_key, cached_result = self._video_result
+            if key is not None and key == cached_key and self._output_unchanged(*cached_result[:2]):
+                output_path, _, violation_frames = cached_result
+                frame_count = len(violation_frames) if violation_frames else 0
+                logger = self.video_processor.detector.logger
+                dashboard_image, csv_path, status_msg = await self._report(
+                    logger, status_msg + " | ♻️ Reused the previous identical run", f" in {frame_count} frames")
+                yield (output_path, self._table_view(logger.get_violations_dataframe()),
+                       dashboard_image, csv_path, status_msg)
+                return
             
-            # Create dashboard and save CSV
-            dashboard_path = None
-            csv_path = None
-            if not violations_df.empty:
-                try:
-                    dashboard_path = self.dashboard.create_dashboard(
-                        self.video_processor.detector.logger.violations_log
-                    )
-                    csv_path = self.video_processor.detector.logger.save_violations_to_csv()
-                    frame_count = len(violation_frames) if violation_frames else 0
-                    status_msg += f" | 🚨 Found {len(violations_df)} violations in {frame_count} frames."
-                except Exception as e:
-                    print(f"Error creating dashboard: {e}")
-                    status_msg += f" | Found {len(violations_df)} violations (dashboard error)."
-            else:
-                status_msg += " | ✅ No violations detected."
+            # Process video on one driver thread; its results reach this handler through a queue
+            def report_progress(frames_done, total_frames):
+                # Containers without a frame count report 0; show frames only
+                fraction = min(frames_done / total_frames, 1.0) if total_frames > 0 else None
+                progress(fraction, desc=f"Frame {frames_done}/{total_frames}" if total_frames > 0
+                         else f"Frame {frames_done}")
+            
+            stream = self.video_processor.stream_video(
+                video_file, enable_plate_detection, batch_size, on_progress=report_progress, stop_event=stop)
+            results = asyncio.Queue()
+            driver = threading.Thread(target=self._drive_stream,
+                                      args=(stream, asyncio.get_running_loop(), results, stop), daemon=True)
+            driver.start()
+            while True:
+                result = await results.get()
+                if isinstance(result, Exception):
+                    raise result
+                output_path, violations_df, violation_frames, complete = result
+                if complete:
+                    break
+                yield output_path, self._table_view(violations_df), None, None, status_msg + " | ⏳ Processing..."
             
-            return output_path, violations_df, dashboard_path, csv_path, status_msg
+            if key is not None and output_path:
+                self._video_result = (key, (output_path, os.stat(output_path).st_mtime_ns, violation_frames))
+            
+            frame_count = len(violation_frames) if violation_frames else 0
+            dashboard_image, csv_path, status_msg = await self._report(
+                self.video_processor.detector.logger, status_msg, f" in {frame_count} frames")
+            
+            yield output_path, self._table_view(violations_df), dashboard_image, csv_path, status_msg
             
         except Exception as e:
             error_msg = f"❌ Error processing video: {str(e)}"
-            print(f"Video processing error: {e}")
-            return None, pd.DataFrame(), None, None, error_msg
+            log.exception("Video processing error")
+            yield None, _EMPTY_DF, None, None, error_msg
+        finally:
+            # A disconnected client closes this handler early; stop the pipeline and wait for its
+            # teardown so the next run never shares the output file with a live writer
+            stop.set()
+            if driver is not None:
+                await asyncio.to_thread(driver.join)
+    
+    @staticmethod
+    def _drive_stream(stream, loop, results, stop):
+        """Run a video stream on this thread, handing each result (or its error) to the event loop's queue"""
+        # next() and close() both run here, so the stream is never closed while it is executing
+        try:
+            for result in stream:
+                loop.call_soon_threadsafe(results.put_nowait, result)
+                if stop.is_set():
+                    break
+        except Exception as e:
+            loop.call_soon_threadsafe(results.put_nowait, e)
+        finally:
+            stream.close()
+    
+    @staticmethod
+    def _video_key(video_file, line_coordinates, enable_plate_detection):
+        """Identify a video run by the input file's path, size and mtime plus the settings that shape it"""
+        try:
+            stat = os.stat(video_file)
+        except OSError:
+            return None
+        return (video_file, stat.st_size, stat.st_mtime_ns, line_coordinates, enable_plate_detection)
+    
+    @staticmethod
+    def _output_unchanged(output_path, mtime_ns):
+        """Check that a previous run's output still exists and was not overwritten by a later run"""
+        try:
+            return os.stat(output_path).st_mtime_ns == mtime_ns
+        except OSError:
+            return False
+    
+    def _table_view(self, violations_df):
+        """Newest UI_TABLE_ROWS rows of the newest-first violations table; the CSV download keeps every row"""
+        if len(violations_df) > Config.UI_TABLE_ROWS:
+            return violations_df.head(Config.UI_TABLE_ROWS)
+        return violations_df
+    
+    async def _report(self, logger, status_msg, found_detail=""):
+        """Create the dashboard and save the CSV for a finished request, extending its status message"""
+        # The table mirrors the log, so its length answers the emptiness check without pandas
+        violation_count = len(logger.violations_log)
+        dashboard_image = None
+        csv_path = None
+        if violation_count:
+            try:
+                dashboard_image, csv_path = await self._dashboard_and_csv(logger)
+                status_msg += f" | 🚨 Found {violation_count} violations{found_detail}."
+            except Exception:
+                log.exception("Error creating dashboard")
+                status_msg += f" | Found {violation_count} violations (dashboard error)."
+        else:
+            status_msg += " | ✅ No violations detected."
+        return dashboard_image, csv_path, status_msg
+    
+    async def _dashboard_and_csv(self, logger):
+        """Render the dashboard and save and export the CSV concurrently in worker threads"""
+        dashboard_image, csv_path = await asyncio.gather(
+            asyncio.to_thread(self._dashboard_for, logger.violations_log),
+            asyncio.to_thread(logger.export_violations_csv))
+        return dashboard_image, csv_path
+    
+    def _dashboard_for(self, log):
+        """Render the dashboard for the log's violation counts, reusing any chart of the same counts"""
+        with self._dashboard_lock:
+            # The log only grows until it is replaced on reset, so only new records are counted
+            counted_log, counted, counts = self._dashboard_counts
+            if log is not counted_log or len(log) < counted:
+                counted, counts = 0, Counter()
+            for violation in log[counted:]:
+                counts[violation['violation_type']] += 1
+            self._dashboard_counts = (log, len(log), counts)
+            
+            if not counts:
+                return None
+            key = tuple(counts.items())
+            dashboard_image = self._dashboard_cache.get(key)
+            if dashboard_image is None:
+                dashboard_image = self.dashboard.create_dashboard_from_counts(counts)
+                self._dashboard_cache[key] = dashboard_image
+                if len(self._dashboard_cache) > Config.DASHBOARD_CACHE_SIZE:
+                    self._dashboard_cache.popitem(last=False)
+            else:
+                self._dashboard_cache.move_to_end(key)
+            return dashboard_image
     
     def clear_violation_logs(self):
         """Clear all violation logs"""
         try:
-            # Clear from both processors
-            success1 = self.image_processor.detector.clear_violation_logs()
-            success2 = self.video_processor.detector.clear_violation_logs()
+            # Clear from both processors, once when they share a detector or logger (as app.py sets up)
+            image_detector, video_detector = self.image_processor.detector, self.video_processor.detector
+            success = image_detector.clear_violation_logs()
+            if video_detector.logger is not image_detector.logger:
+                success = video_detector.clear_violation_logs() and success
+            self._summary_cache = (None, None)
+            self._video_result = (None, None)  # Its violations are gone from the log
             
-            if success1 and success2:
-                return "✅ Violation logs cleared successfully!", pd.DataFrame()
+            if success:
+                return "✅ Violation logs cleared successfully!", _EMPTY_DF
             else:
-                return "⚠️ Warning: Some logs may not have been cleared.", pd.DataFrame()
+                return "⚠️ Warning: Some logs may not have been cleared.", _EMPTY_DF
         except Exception as e:
-            return f"❌ Error clearing logs: {str(e)}", pd.DataFrame()
+            return f"❌ Error clearing logs: {str(e)}", _EMPTY_DF
     
     def get_csv_summary(self):
-        """Get summary of violation logs"""
+        """Get summary of violation logs, reusing the last one while the CSV log is unchanged"""
         try:
-            summary = self.image_processor.detector.logger.get_csv_summary()
-            summary_text = f"""
-📊 **Violation Log Summary:**
-- Total Violations: {summary['total_violations']}
-- Repeat Offenders: {summary['repeat_offenders']}
-- Latest Violation: {summary['latest_violation']}
-**Violation Types:**
-"""
-            for vtype, count in summary['violation_types'].items():
-                summary_text += f"\n- {vtype.replace('_', ' ').title()}: {count}"
-            
-            if summary['total_violations'] == 0:
-                summary_text = "📊 **No violations recorded yet.**"
+            logger = self.image_processor.detector.logger
+            try:
+                stat = os.stat(logger.csv_file)
+                key = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                key = None
             
+            cached_key, summary_text = self._summary_cache
+            if key is None or key != cached_key:
+                summary_text = self._format_summary(logger.get_csv_summary())
+                self._summary_cache = (key, summary_text)
             return summary_text
         except Exception as e:
             return f"❌ Error getting summary: {str(e)}"
+    
+    def _format_summary(self, summary):
+        """Render a logger summary as Markdown"""
+        if summary['total_violations'] == 0:
+            return "📊 **No violations recorded yet.**"
+        
+        type_lines = ''.join(f"\n- {vtype.replace('_', ' ').title()}: {count}"
+                             for vtype, count in summary['violation_types'].items())
+        return _SUMMARY_TEMPLATE.format(type_lines=type_lines, **summary)
 
 def create_interface(image_processor, video_processor):
     """Create enhanced Gradio interface"""
     interface = TrafficViolationInterface(image_processor, video_processor)
     
+    # Warm up in the background while the UI is built and launched
+    threading.Thread(target=interface.warm_up, daemon=True).start()
+    
     with gr.Blocks(title="Enhanced Traffic Violation Detection System", theme=gr.themes.Soft()) as iface:
         
         gr.Markdown("# 🚦 Enhanced Traffic Violation Detection System")
@@ -193,12 +412,13 @@ def create_interface(image_processor, video_processor):
                                 )
                                 csv_download = gr.File(label="📥 Download Complete Log (CSV)")
                             with gr.Column():
-                                dashboard_chart = gr.Image(label="📊 Violation Dashboard")
+                                dashboard_chart = gr.Image(label="📊 Violation Dashboard", type="numpy")
             
             with gr.TabItem("🎥 Video Analysis"):
                 with gr.Row():
                     with gr.Column(scale=1):
-                        video_input = gr.Video(label="Upload Traffic Video")
+                        # Detection ignores sound, so webcam recordings are captured without it
+                        video_input = gr.Video(label="Upload Traffic Video", include_audio=False)
                         
                         with gr.Group():
                             gr.Markdown("### ⚙️ Violation Line Setup")
@@ -216,6 +436,14 @@ def create_interface(image_processor, video_processor):
                                 value=True,
                                 info="Improved OCR for Indian license plates"
                             )
+                            batch_size_video = gr.Slider(
+                                label="Detection Batch Size",
+                                minimum=1,
+                                maximum=Config.YOLO_BATCH_SIZE,
+                                value=Config.YOLO_BATCH_SIZE,
+                                step=1,
+                                info="Frames per detector call; lower it if the GPU runs out of memory"
+                            )
                         
                         process_vid_btn = gr.Button("🎬 Analyze Video", variant="primary", size="lg")
                         
@@ -237,7 +465,7 @@ def create_interface(image_processor, video_processor):
                                 )
                                 csv_download_video = gr.File(label="📥 Download Complete Log (CSV)")
                             with gr.Column():
-                                dashboard_chart_video = gr.Image(label="📊 Violation Dashboard")
+                                dashboard_chart_video = gr.Image(label="📊 Violation Dashboard", type="numpy")
         
         # Management section
         with gr.Row():
@@ -299,28 +527,44 @@ def create_interface(image_processor, video_processor):
         process_img_btn.click(
             interface.process_image,
             inputs=[image_input, line_input, enable_plates],
-            outputs=[output_image, violations_table, dashboard_chart, csv_download, img_status]
+            outputs=[output_image, violations_table, dashboard_chart, csv_download, img_status],
+            concurrency_limit=Config.UI_CONCURRENCY_LIMIT,
+            concurrency_id="image"
         )
         
         process_vid_btn.click(
             interface.process_video,
-            inputs=[video_input, line_input_video, enable_plates_video],
-            outputs=[output_video, violations_table_video, dashboard_chart_video, csv_download_video, vid_status]
+            inputs=[video_input, line_input_video, enable_plates_video, batch_size_video],
+            outputs=[output_video, violations_table_video, dashboard_chart_video, csv_download_video, vid_status],
+            concurrency_limit=1,
+            concurrency_id="video"
         )
         
         clear_btn.click(
             interface.clear_violation_logs,
-            outputs=[clear_status, violations_table]
+            outputs=[clear_status, violations_table],
+            concurrency_limit=None,
+            concurrency_id="io"
         )
         
         summary_btn.click(
             interface.get_csv_summary,
-            outputs=[summary_output]
+            outputs=[summary_output],
+            concurrency_limit=None,
+            concurrency_id="io"
         )
         
         refresh_btn.click(
             interface.get_csv_summary,
-            outputs=[summary_output]
+            outputs=[summary_output],
+            concurrency_limit=None,
+            concurrency_id="io"
         )
     
+    # Image requests wait together in the batcher, which processes one batch at a time. A video run
+    # owns the video pipeline's tracks, caches and fixed output files, so videos run one at a
+    # time. Log and summary clicks are unlimited "io" events so they never queue behind a video.
+    # API clients should call these Gradio endpoints so their requests go through this queue
+    iface.queue(default_concurrency_limit=Config.UI_CONCURRENCY_LIMIT, max_size=Config.UI_QUEUE_MAX_SIZE)
+    
     return iface